@@ -1,15 +1,13 @@
 # app.py
-from flask import Flask, request, jsonify, send_from_directory, Response
+from flask import Flask, request, jsonify, Response, g
 from flask_cors import CORS
-import os, time, traceback, json, threading
+import os, time, traceback, json, threading, atexit
+from concurrent.futures import ThreadPoolExecutor, Future, FIRST_COMPLETED, wait
 import openai
-import azure.cognitiveservices.speech as speechsdk
 from openai import AzureOpenAI
-from pydub import AudioSegment
-from pydub.silence import split_on_silence
 from io import BytesIO
-import cv2
-import mediapipe as mp
+from types import SimpleNamespace
+from collections import OrderedDict
 from datetime import datetime
 import uuid
 from dotenv import load_dotenv
@@ -18,9 +16,15 @@ from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 from azure.cosmos.exceptions import CosmosResourceNotFoundError
 from azure.cosmos.exceptions import CosmosResourceExistsError
+from azure.cosmos.exceptions import CosmosAccessConditionFailedError
+from azure.core import MatchConditions
 import sys
 import traceback
 import re
+from similarity_cache import SimilarityCache
+import progress
+from token_cache import VerifiedTokenCache
+from static_assets import StaticAssetManifest
 
 
 
@@ -28,7 +32,8 @@ import re
 import logging
 logging.basicConfig(filename="debug.log", level=logging.DEBUG)
 # --- App Initialization ---
-app = Flask(__name__, static_folder="dist", static_url_path="/")
+# static files are served from memory by serve_frontend, not by Flask's static route
+app = Flask(__name__, static_folder=None)
 CORS(app)
 
 # Load environment variables
@@ -41,26 +46,102 @@ load_dotenv()
 # now pull it in from env
 JWT_SECRET    = os.getenv("JWT_SECRET")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+# --- Request authentication ---
+# Session-scoped requests carrying "Authorization: Bearer <jwt>" are verified once and
+# their claims cached (token_cache.VerifiedTokenCache), so the 5-second /api/bodymetrics
+# poll costs a digest + dict lookup rather than a signature check. A bad token there
+# is a 401. With AUTH_REQUIRED=true, those routes also reject anonymous calls;
+# otherwise they are served as before, limited to unowned sessions. Other routes
+# (login, signup, ...) ignore the header.
+AUTH_REQUIRED            = os.getenv("AUTH_REQUIRED", "false").lower() == "true"
+JWT_CACHE_MAX_ENTRIES    = int(os.getenv("JWT_CACHE_MAX_ENTRIES", "4096"))
+JWT_CACHE_TTL_SECS       = float(os.getenv("JWT_CACHE_TTL_SECS", "300"))
+SESSION_SCOPED_PREFIXES  = ("/api/analyze", "/api/chats", "/api/bodymetrics", "/api/progress")
+
+verified_tokens = VerifiedTokenCache(
+    decode=lambda token: jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM]),
+    max_entries=JWT_CACHE_MAX_ENTRIES,
+    default_ttl=JWT_CACHE_TTL_SECS,
+)
+
+
+@app.before_request
+def authenticate_request():
+    g.user_id = None
+    g.claims  = None
+    # only session-scoped routes look at the token: /api/login and /api/signup must
+    # keep working for a client that still holds an expired one
+    if request.method == "OPTIONS" or not request.path.startswith(SESSION_SCOPED_PREFIXES):
+        return None
+
+    auth = request.headers.get("Authorization", "")
+    if auth.startswith("Bearer "):
+        try:
+            g.claims = verified_tokens.verify(auth[len("Bearer "):])
+        except jwt.InvalidTokenError:
+            return jsonify({"error": "Invalid or expired token"}), 401
+        g.user_id = g.claims.get("sub")
+    elif AUTH_REQUIRED:
+        return jsonify({"error": "Unauthorized"}), 401
+    return None
+
+
+def request_user_id() -> str | None:
+    """User id (JWT `sub`) attached by authenticate_request, or None for anonymous calls"""
+    return g.get("user_id")
+
+
+def session_visible_to(session: dict, user_id: str | None) -> bool:
+    """Sessions created before auth have no owner and stay visible to everyone"""
+    owner = session.get("userId")
+    return owner is None or owner == user_id
+
+
 # --- Azure Cosmos DB Setup ---
 # COSMOS_CONN_STR = os.getenv("COSMOS_CONN_STR")
 # client = MongoClient(COSMOS_CONN_STR)
 # db = client["General-db"]
 # chat_sessions = db["Chats"]  # Collection for chat history
 
-endpoint = os.getenv("COSMOS_DB_URI")  # Or COSMOS_CONN_STR.split("AccountEndpoint=")[1].split(";")[0]
-key = os.getenv("COSMOS_DB_KEY")
+# The client (which talks to Cosmos as soon as it's constructed) is created on the
+# first container call, so importing the app or serving the frontend never waits on it.
+_cosmos_client = None
+_cosmos_lock   = threading.Lock()
 
-client = CosmosClient(endpoint, credential=key)
-# Add this:
-app_db   = client.get_database_client("General-db")
-chat_sessions     = app_db.get_container_client("ChatsV2")
-explain_sessions  = app_db.get_container_client("ExplainSessions")
+def get_cosmos_client() -> CosmosClient:
+    global _cosmos_client
+    with _cosmos_lock:
+        if _cosmos_client is None:
+            endpoint = os.getenv("COSMOS_DB_URI")  # Or COSMOS_CONN_STR.split("AccountEndpoint=")[1].split(";")[0]
+            key = os.getenv("COSMOS_DB_KEY")
+            _cosmos_client = CosmosClient(endpoint, credential=key)
+        return _cosmos_client
+
+
+class LazyContainer:
+    """Stands in for a ContainerProxy and resolves it on first use"""
+
+    def __init__(self, database: str, container: str):
+        self._database  = database
+        self._container = container
+        self._proxy     = None
+
+    def __getattr__(self, name):
+        if self._proxy is None:
+            self._proxy = get_cosmos_client().get_database_client(self._database).get_container_client(self._container)
+        return getattr(self._proxy, name)
+
+
+chat_sessions     = LazyContainer("General-db", "ChatsV2")
+explain_sessions  = LazyContainer("General-db", "ExplainSessions")
+chat_archive      = LazyContainer("General-db", "ChatArchive")
+user_progress     = LazyContainer("General-db", "UserProgress")
 
 
 # Create or access a container (table)
 # …but pull your users out of the UserAuthDB database
-auth_db          = client.get_database_client("UserAuthDB")
-users_container  = auth_db.get_container_client("Users")
+users_container  = LazyContainer("UserAuthDB", "Users")
+user_emails      = LazyContainer("UserAuthDB", "UserEmails")
 
 # --- Azure Speech config ---
 SPEECH_KEY = os.getenv("SPEECH_KEY")
@@ -73,10 +154,95 @@ openai.api_version = os.getenv("OPENAI_API_VERSION")
 openai.api_key = os.getenv("AZURE_OPENAI_KEY")
 GPT_DEPLOYMENT_NAME = os.getenv("GPT_DEPLOYMENT_NAME")
 
-# --- MediaPipe setup for Body Language ---
-mp_holistic  = mp.solutions.holistic
-mp_face_mesh = mp.solutions.face_mesh
-mp_drawing   = mp.solutions.drawing_utils
+# --- Lazily loaded subsystems ---
+# cv2/mediapipe, the Speech SDK and pydub cost seconds and hundreds of MB per worker,
+# so they're imported on first use. WORKER_PROFILE picks what a worker may load:
+#   api   — chat/auth/analysis only; media routes answer 503
+#   media — everything, intended for the workers behind /api/transcribe and /api/bodytrack
+#   all   — everything (default, same routes as before)
+# WARM_UP=true preloads the profile's subsystems (and, except on media workers, the
+# in-memory frontend bundle) on a background thread after import.
+WORKER_PROFILE = os.getenv("WORKER_PROFILE", "all").lower()
+PROFILE_SUBSYSTEMS = {
+    "api":   set(),
+    "media": {"vision", "speech", "audio"},
+    "all":   {"vision", "speech", "audio"},
+}
+if WORKER_PROFILE not in PROFILE_SUBSYSTEMS:
+    raise RuntimeError(f"Unknown WORKER_PROFILE '{WORKER_PROFILE}' (expected one of {sorted(PROFILE_SUBSYSTEMS)})")
+
+
+class SubsystemUnavailable(Exception):
+    """Raised when a route needs a subsystem this worker profile doesn't load"""
+
+
+def _load_vision():
+    import cv2
+    import mediapipe as mp
+    return SimpleNamespace(
+        cv2=cv2,
+        mp_holistic=mp.solutions.holistic,
+        mp_face_mesh=mp.solutions.face_mesh,
+        mp_drawing=mp.solutions.drawing_utils,
+    )
+
+
+def _load_speech():
+    import azure.cognitiveservices.speech as speechsdk
+    return speechsdk
+
+
+def _load_audio():
+    from pydub import AudioSegment
+    from pydub.silence import split_on_silence
+    return SimpleNamespace(AudioSegment=AudioSegment, split_on_silence=split_on_silence)
+
+
+SUBSYSTEM_LOADERS = {
+    "vision": _load_vision,
+    "speech": _load_speech,
+    "audio":  _load_audio,
+}
+_subsystems: dict[str, object] = {}
+_subsystem_lock = threading.Lock()
+
+
+def subsystem(name: str):
+    """Import a subsystem on first use (once per worker) and return it"""
+    loaded = _subsystems.get(name)
+    if loaded is not None:
+        return loaded
+    if name not in PROFILE_SUBSYSTEMS[WORKER_PROFILE]:
+        raise SubsystemUnavailable(f"'{name}' is not available on '{WORKER_PROFILE}' workers")
+    with _subsystem_lock:
+        if name not in _subsystems:
+            started = time.perf_counter()
+            _subsystems[name] = SUBSYSTEM_LOADERS[name]()
+            print(f"🔌 Loaded {name} subsystem in {time.perf_counter() - started:.2f}s")
+        return _subsystems[name]
+
+
+def warm_up():
+    """Load everything this worker's profile allows (e.g. from a gunicorn post_fork hook)"""
+    for name in sorted(PROFILE_SUBSYSTEMS[WORKER_PROFILE]):
+        try:
+            subsystem(name)
+        except Exception:
+            logging.exception(f"Warm-up of {name} failed")
+    if WORKER_PROFILE != "media":  # media workers aren't routed frontend traffic
+        try:
+            get_static_assets()
+        except Exception:
+            logging.exception("Warm-up of the static assets failed")
+
+
+@app.errorhandler(SubsystemUnavailable)
+def subsystem_unavailable(e):
+    return jsonify({"error": str(e)}), 503
+
+
+if os.getenv("WARM_UP", "false").lower() == "true":
+    threading.Thread(target=warm_up, daemon=True, name="warm-up").start()
 
 # Metrics globals for body tracking
 cap = None
@@ -90,6 +256,8 @@ last_frame = None
 
 def camera_worker_loop():
     global cap, frame_count, upright_count, nod_count, last_nod_y, hand_gesture_ct, last_frame
+    vision = subsystem("vision")
+    cv2, mp_holistic, mp_face_mesh, mp_drawing = vision.cv2, vision.mp_holistic, vision.mp_face_mesh, vision.mp_drawing
     cap = cv2.VideoCapture(0)
     if not cap.isOpened():
         print("❌ Webcam not accessible.")
@@ -161,12 +329,13 @@ def generate_chat_title(transcript: str) -> str:
 
 # after (Cosmos style)
 # create a new session (only if you want to allow collisions you can catch the exception)
-def create_chat_session(transcript, mode, audience_level, session_id=None):
+def create_chat_session(transcript, mode, audience_level, session_id=None, user_id=None):
     session_id = session_id or str(uuid.uuid4())
     try:
         chat_sessions.create_item({
         "id": session_id,
         "sessionId": session_id,
+        "user_id": user_id,
         "title": generate_chat_title(transcript),
         "mode": mode,
         "audience_level": audience_level,
@@ -180,17 +349,23 @@ def create_chat_session(transcript, mode, audience_level, session_id=None):
 
 
 # helper to fetch a session (or None)
-def get_chat_history(session_id: str) -> dict | None:
+def get_chat_history(session_id: str, full: bool = False) -> dict | None:
     try:
         item = chat_sessions.read_item(item=session_id, partition_key=session_id)
     except CosmosResourceNotFoundError:
         return None
+    messages = item.get("messages", [])
+    if full and item.get("archived_chunks"):
+        messages = get_archived_messages(session_id) + messages
     # you can safely assume these keys exist now
     return {
         "id":           item["id"],
         "title":        item.get("title"),
         "mode":         item.get("mode"),
-        "messages":     item.get("messages", []),
+        "messages":     messages,
+        "userId":       item.get("user_id"),
+        "summary":      item.get("summary"),
+        "archivedCount": item.get("archived_count", 0),
         "last_updated": item.get("last_updated"),
     }
 
@@ -213,20 +388,348 @@ def update_chat_session(session_id: str, message: dict, feedback: dict | None =
 
     chat_sessions.upsert_item(body=session)
 
+    # Presentation feedback lands together with the assistant reply to the transcript
+    if feedback and session.get("mode") == "Presentation" and session.get("user_id"):
+        transcript_msg = _last_user_message(session["messages"])
+        if transcript_msg:
+            record_presentation_progress(session["user_id"], transcript_msg["content"], transcript_msg.get("timestamp"))
+
+    if needs_compaction(session):
+        schedule_compaction(session_id)
+
+
+# ===== CHAT COMPACTION =====
+# Past COMPACT_MAX_MESSAGES messages (or COMPACT_MAX_BYTES of them) the older turns
+# of a ChatsV2 doc move into a ChatArchive record (partitioned by sessionId), and the
+# hot doc keeps a rolling GPT summary of everything archived plus the last
+# COMPACT_KEEP_RECENT messages. get_chat_history(full=True) stitches history back.
+COMPACT_MAX_MESSAGES = int(os.getenv("COMPACT_MAX_MESSAGES", "40"))
+COMPACT_MAX_BYTES    = int(os.getenv("COMPACT_MAX_BYTES", str(256 * 1024)))
+COMPACT_KEEP_RECENT  = int(os.getenv("COMPACT_KEEP_RECENT", "12"))
+# cap on how much of each archived message goes into the summary prompt
+COMPACT_SUMMARY_CHARS_PER_MESSAGE = 600
+
+_compaction_pool     = ThreadPoolExecutor(max_workers=1, thread_name_prefix="compaction")
+_compaction_lock     = threading.Lock()
+_compaction_inflight: set[str] = set()
+
+
+def needs_compaction(session: dict) -> bool:
+    messages = session.get("messages", [])
+    if len(messages) <= COMPACT_KEEP_RECENT:
+        return False
+    if len(messages) > COMPACT_MAX_MESSAGES:
+        return True
+    return len(json.dumps(messages)) > COMPACT_MAX_BYTES
+
+
+def schedule_compaction(session_id: str):
+    """Compact in the background so the request that crossed the limit doesn't wait on it"""
+    with _compaction_lock:
+        if session_id in _compaction_inflight:
+            return
+        _compaction_inflight.add(session_id)
+    _compaction_pool.submit(_run_compaction, session_id)
+
+
+def _run_compaction(session_id: str):
+    try:
+        compact_chat_session(session_id)
+    except Exception:
+        logging.exception(f"Compaction failed for {session_id}")
+    finally:
+        with _compaction_lock:
+            _compaction_inflight.discard(session_id)
+
+
+def summarize_archived_messages(previous_summary: str | None, messages: list[dict]) -> str:
+    """Fold the archived messages into the rolling summary (plain fallback if GPT is unavailable)"""
+    transcript = "\n".join(
+        f"{m.get('type', 'user')}: {m.get('content', '')[:COMPACT_SUMMARY_CHARS_PER_MESSAGE]}"
+        for m in messages
+    )
+    try:
+        resp = get_openai_client().chat.completions.create(
+            model=GPT_DEPLOYMENT_NAME,
+            messages=[
+                {"role": "system", "content": (
+                    "You maintain a running summary of a teaching/presentation coaching chat. "
+                    "Merge the previous summary with the new messages into one summary under 150 words. "
+                    "Keep the topic, the key feedback given and how the student is progressing. "
+                    "Return only the summary text."
+                )},
+                {"role": "user", "content": f"Previous summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"}
+            ],
+            temperature=0,
+            max_tokens=300
+        )
+        return resp.choices[0].message.content.strip()
+    except Exception as e:
+        print("⚠️ Compaction summary failed, keeping plain summary:", e)
+        note = f"({len(messages)} earlier messages archived)"
+        return f"{previous_summary}\n{note}" if previous_summary else note
+
+
+COMPACT_MAX_ATTEMPTS = 3
+
+def compact_chat_session(session_id: str, attempt: int = 1) -> bool:
+    """Move older messages of a session into ChatArchive; returns True if the hot doc was compacted"""
+    try:
+        session = chat_sessions.read_item(item=session_id, partition_key=session_id)
+    except CosmosResourceNotFoundError:
+        return False
+    if not needs_compaction(session):
+        return False
+
+    messages = session["messages"]
+    old, recent = messages[:-COMPACT_KEEP_RECENT], messages[-COMPACT_KEEP_RECENT:]
+    seq = session.get("archived_chunks", 0)
+
+    # Deterministic id: if the replace below loses a race, the retry overwrites this chunk
+    chat_archive.upsert_item(body={
+        "id":        f"{session_id}:{seq:06d}",
+        "sessionId": session_id,
+        "seq":       seq,
+        "messages":  old,
+        "archived_at": datetime.utcnow().isoformat() + "Z"
+    })
+
+    session["summary"]         = summarize_archived_messages(session.get("summary"), old)
+    session["messages"]        = recent
+    session["archived_chunks"] = seq + 1
+    session["archived_count"]  = session.get("archived_count", 0) + len(old)
+    try:
+        chat_sessions.replace_item(
+            item=session_id,
+            body=session,
+            etag=session["_etag"],
+            match_condition=MatchConditions.IfNotModified
+        )
+    except CosmosAccessConditionFailedError:
+        # a message was appended meanwhile — try again on the fresh doc
+        if attempt >= COMPACT_MAX_ATTEMPTS:
+            print(f"[⚠] Session {session_id} kept changing during compaction, giving up for now.")
+            return False
+        print(f"[⚠] Session {session_id} changed during compaction, retrying.")
+        return compact_chat_session(session_id, attempt + 1)
+    print(f"🗜️ Compacted session {session_id}: archived {len(old)} messages (chunk {seq})")
+    return True
+
+
+def get_archived_messages(session_id: str) -> list[dict]:
+    """All archived messages of a session, oldest first (single-partition query)"""
+    chunks = chat_archive.query_items(
+        query="SELECT c.seq, c.messages FROM c WHERE c.sessionId = @sid ORDER BY c.seq",
+        parameters=[{"name": "@sid", "value": session_id}],
+        partition_key=session_id
+    )
+    return [m for chunk in chunks for m in chunk["messages"]]
+
+
+def delete_archived_messages(session_id: str):
+    for chunk in chat_archive.query_items(
+        query="SELECT c.id FROM c WHERE c.sessionId = @sid",
+        parameters=[{"name": "@sid", "value": session_id}],
+        partition_key=session_id
+    ):
+        chat_archive.delete_item(item=chunk["id"], partition_key=session_id)
+
+
+# ===== USER PROGRESS AGGREGATES =====
+# One UserProgress doc per user (id == userId) holding weekly rollups — see progress.py.
+# Presentation feedback is folded in as update_chat_session stores it; body-metrics
+# windows are buffered in memory per user so the 5-second /api/bodymetrics poll doesn't
+# turn into a Cosmos write each time. A buffer is flushed once it is BODY_FLUSH_SECS
+# old — by the next poll or by a background flusher when the user stops polling —
+# and whatever is left is flushed when the worker exits. It is filed under the week
+# the buffer started in.
+BODY_FLUSH_SECS      = int(os.getenv("BODY_FLUSH_SECS", "60"))
+PROGRESS_MAX_ATTEMPTS = 3
+
+_body_windows_lock = threading.Lock()
+# user id -> (started monotonic, started utc, window sums)
+_body_windows: dict[str, tuple[float, datetime, dict]] = {}
+_body_flusher_started = False
+
+
+def get_user_progress(user_id: str) -> dict | None:
+    try:
+        return user_progress.read_item(item=user_id, partition_key=user_id)
+    except CosmosResourceNotFoundError:
+        return None
+
+
+def update_user_progress(user_id: str, apply):
+    """Read-modify-write a user's rollup with an etag check, retrying on concurrent updates"""
+    for _ in range(PROGRESS_MAX_ATTEMPTS):
+        rollup = get_user_progress(user_id)
+        if rollup is None:
+            rollup = apply(progress.empty_rollup(user_id))
+            rollup["last_updated"] = datetime.utcnow().isoformat() + "Z"
+            try:
+                user_progress.create_item(body=rollup)
+                return
+            except CosmosResourceExistsError:
+                continue
+        rollup = apply(rollup)
+        rollup["last_updated"] = datetime.utcnow().isoformat() + "Z"
+        try:
+            user_progress.replace_item(
+                item=user_id,
+                body=rollup,
+                etag=rollup["_etag"],
+                match_condition=MatchConditions.IfNotModified
+            )
+            return
+        except CosmosAccessConditionFailedError:
+            continue
+    print(f"[⚠] Gave up updating progress for {user_id} after {PROGRESS_MAX_ATTEMPTS} attempts.")
+
+
+def record_presentation_progress(user_id: str, transcript: str, when: str | None = None):
+    metrics = progress.transcript_metrics(transcript)
+    try:
+        update_user_progress(user_id, lambda r: progress.apply_presentation(r, metrics, when))
+    except Exception:
+        logging.exception(f"Progress update failed for {user_id}")
+
+
+def _flush_body_buffer(user_id: str, buffered: tuple[float, datetime, dict]):
+    _, started_at, window = buffered
+    try:
+        update_user_progress(user_id, lambda r: progress.apply_body_windows(r, window, started_at))
+    except Exception:
+        logging.exception(f"Body metrics progress update failed for {user_id}")
+
+
+def flush_body_windows(force: bool = False):
+    """Flush every buffer that is due (or all of them with force=True)"""
+    now = time.monotonic()
+    with _body_windows_lock:
+        due = [
+            user_id for user_id, (started, _, _) in _body_windows.items()
+            if force or now - started >= BODY_FLUSH_SECS
+        ]
+        flushing = [(user_id, _body_windows.pop(user_id)) for user_id in due]
+    for user_id, buffered in flushing:
+        _flush_body_buffer(user_id, buffered)
+
+
+def _body_flusher_loop():
+    while True:
+        time.sleep(max(BODY_FLUSH_SECS / 2, 1))
+        flush_body_windows()
+
+
+def ensure_body_flusher_running():
+    global _body_flusher_started
+    with _body_windows_lock:
+        if _body_flusher_started:
+            return
+        _body_flusher_started = True
+    threading.Thread(target=_body_flusher_loop, daemon=True, name="body-flusher").start()
+
+
+atexit.register(flush_body_windows, force=True)
+
+
+def record_body_window(user_id: str, posture: int, gesture_rate: int, nod_rate: int):
+    """Buffer one body-metrics window; flush the user's buffer to Cosmos when it is due"""
+    ensure_body_flusher_running()
+    now = time.monotonic()
+    with _body_windows_lock:
+        buffered = _body_windows.get(user_id)
+        if buffered is None:
+            buffered = _body_windows[user_id] = (now, datetime.utcnow(), progress.empty_body_window())
+        progress.add_body_sample(buffered[2], posture, gesture_rate, nod_rate)
+        if now - buffered[0] < BODY_FLUSH_SECS:
+            return
+        del _body_windows[user_id]
+    _flush_body_buffer(user_id, buffered)
+
+
+def _last_user_message(messages: list[dict]) -> dict | None:
+    return next((m for m in reversed(messages) if m.get("type") == "user"), None)
+
+
+def backfill_user_progress() -> int:
+    """Rebuild every user's Presentation rollup from ChatsV2 (body-metrics buckets are kept); returns users written"""
+    rebuilt: dict[str, dict] = {}
+    sessions = chat_sessions.query_items(
+        query="SELECT c.id, c.user_id, c.messages, c.archived_chunks FROM c "
+              "WHERE c.mode = 'Presentation' AND IS_STRING(c.user_id)",
+        enable_cross_partition_query=True
+    )
+    for session in sessions:
+        messages = session.get("messages", [])
+        if session.get("archived_chunks"):
+            messages = get_archived_messages(session["id"]) + messages
+        rollup = rebuilt.setdefault(session["user_id"], progress.empty_rollup(session["user_id"]))
+        for msg, reply in zip(messages, messages[1:]):
+            # same rule as update_chat_session: a transcript counts once its feedback
+            # reply was written; undated ones can't be filed under the right week
+            if (msg.get("type") == "user" and msg.get("content") and msg.get("timestamp")
+                    and reply.get("type") == "assistant"):
+                progress.apply_presentation(rollup, progress.transcript_metrics(msg["content"]), msg["timestamp"])
+
+    for user_id, rollup in rebuilt.items():
+        # etag-guarded, so body windows flushed while the backfill runs aren't overwritten
+        update_user_progress(user_id, lambda current, rebuilt_rollup=rollup:
+                             progress.replace_presentation_buckets(current, rebuilt_rollup))
+    return len(rebuilt)
+
+
+@app.cli.command("backfill-progress")
+def backfill_progress_command():
+    """Rebuild UserProgress rollups from existing sessions: flask --app app backfill-progress"""
+    count = backfill_user_progress()
+    print(f"✅ Rebuilt progress for {count} users")
+
 
 # ---- Explain Session DB Functions ----
 
 from azure.cosmos.exceptions import CosmosResourceExistsError
 
+# Explain Mode is a small state machine stored on the ExplainSessions doc:
+#
+#   awaiting_explanation --(explanation + 3 questions)--> asking
+#   asking --(answer, more questions left)--> asking
+#   asking --(last answer)--> ready_to_summarize
+#   ready_to_summarize --(summarize)--> summarized
+#   summarized --(summarize again | new explanation)--> summarized | asking
+#
+# The explanation and each question/answer turn live on the doc itself, so the
+# summary input is assembled from at most 3 turns instead of rescanning the chat.
+EXPLAIN_AWAITING_EXPLANATION = "awaiting_explanation"
+EXPLAIN_ASKING               = "asking"
+EXPLAIN_READY_TO_SUMMARIZE   = "ready_to_summarize"
+EXPLAIN_SUMMARIZED           = "summarized"
+
+EXPLAIN_TRANSITIONS = {
+    EXPLAIN_AWAITING_EXPLANATION: {EXPLAIN_ASKING},
+    EXPLAIN_ASKING:               {EXPLAIN_ASKING, EXPLAIN_READY_TO_SUMMARIZE},
+    EXPLAIN_READY_TO_SUMMARIZE:   {EXPLAIN_SUMMARIZED},
+    EXPLAIN_SUMMARIZED:           {EXPLAIN_SUMMARIZED, EXPLAIN_ASKING},
+}
+
+EXPLAIN_QUESTION_COUNT = 3
+
+
+class ExplainStateError(Exception):
+    """Raised when an Explain Mode turn is not valid for the session's current state"""
+
+
 def create_explain_session(session_id: str):
     """Initialize a new Explain Mode session in CosmosDB"""
     try:
         explain_sessions.create_item(body={
             "id": session_id,
             "sessionId": session_id,
+            "state": EXPLAIN_AWAITING_EXPLANATION,
+            "version": 0,
+            "explanation": None,
+            "turns": [],
             "question_index": 0,
-            "pending_questions": [],
-            "teacher_responses": [],
             "created_at": datetime.utcnow().isoformat() + "Z",
             "last_updated": datetime.utcnow().isoformat() + "Z"
         })
@@ -246,18 +749,472 @@ def get_explain_session(session_id: str) -> dict:
         return None
 
 
-def update_explain_session(session_id: str, update_data: dict):
-    # Try to fetch an existing doc, but if it doesn't exist we'll start a new one
-    existing = get_explain_session(session_id) or {}
-    # Build a full session body
-    session = {
-        "id": session_id,
-        # carry forward any previously stored fields
-        **existing,
-        **update_data,
+def _upgrade_explain_session(doc: dict) -> dict:
+    """Map docs written before the state machine (pending_questions/teacher_responses) onto turns"""
+    if "state" in doc:
+        return doc
+    pending   = doc.get("pending_questions") or []
+    responses = doc.get("teacher_responses") or []
+    turns = [
+        {"question": q, "answer": responses[i] if i < len(responses) else None}
+        for i, q in enumerate(pending)
+    ]
+    if not turns:
+        state = EXPLAIN_AWAITING_EXPLANATION
+    elif all(t["answer"] is not None for t in turns):
+        state = EXPLAIN_READY_TO_SUMMARIZE
+    else:
+        state = EXPLAIN_ASKING
+    return {
+        **doc,
+        "state": state,
+        "version": 0,
+        "explanation": doc.get("original_text"),
+        "turns": turns,
+        "question_index": min(len(responses), len(turns)),
+    }
+
+
+def load_explain_state(session_id: str) -> dict:
+    """Fetch (creating if needed) the Explain session, upgraded to the state-machine layout"""
+    doc = get_explain_session(session_id)
+    if not doc:
+        create_explain_session(session_id)
+        doc = get_explain_session(session_id) or {
+            "id": session_id,
+            "sessionId": session_id,
+            "state": EXPLAIN_AWAITING_EXPLANATION,
+            "version": 0,
+            "explanation": None,
+            "turns": [],
+            "question_index": 0,
+        }
+    return _upgrade_explain_session(doc)
+
+
+def advance_explain_state(doc: dict, new_state: str, **changes) -> dict:
+    """Validate a transition, apply the field changes and persist the whole doc.
+
+    The write is conditional on the etag we read, so two overlapping turns can't
+    both advance from the same state — the loser gets an ExplainStateError (409).
+    """
+    current = doc.get("state", EXPLAIN_AWAITING_EXPLANATION)
+    if new_state not in EXPLAIN_TRANSITIONS.get(current, set()):
+        raise ExplainStateError(f"Cannot move Explain session from '{current}' to '{new_state}'")
+
+    doc = {
+        **doc,
+        **changes,
+        "state": new_state,
+        "version": doc.get("version", 0) + 1,
         "last_updated": datetime.utcnow().isoformat() + "Z"
     }
-    explain_sessions.upsert_item(body=session)
+    # legacy fields are fully represented by explanation/turns now
+    for stale in ("pending_questions", "teacher_responses", "original_text"):
+        doc.pop(stale, None)
+    try:
+        if "_etag" in doc:
+            return explain_sessions.replace_item(
+                item=doc["id"],
+                body=doc,
+                etag=doc["_etag"],
+                match_condition=MatchConditions.IfNotModified
+            )
+        return explain_sessions.create_item(body=doc)
+    except (CosmosAccessConditionFailedError, CosmosResourceExistsError):
+        raise ExplainStateError("Explain session changed while this turn was being processed, please retry")
+
+
+def start_explain_turns(doc: dict, explanation: str, questions: list[str]) -> dict:
+    """Store the teacher's explanation and the generated questions, moving to 'asking'"""
+    if not questions:
+        raise ExplainStateError("Cannot start Explain questions without any questions")
+    return advance_explain_state(
+        doc,
+        EXPLAIN_ASKING,
+        explanation=explanation,
+        turns=[{"question": q, "answer": None} for q in questions[:EXPLAIN_QUESTION_COUNT]],
+        question_index=0,
+    )
+
+
+def record_explain_answer(doc: dict, answer: str) -> tuple[dict, str | None]:
+    """Attach the answer to the current question; returns (doc, next question or None when done)"""
+    if doc.get("state") != EXPLAIN_ASKING:
+        raise ExplainStateError(f"Not expecting an answer in state '{doc.get('state')}'")
+
+    idx   = doc.get("question_index", 0)
+    turns = [dict(t) for t in doc.get("turns", [])]
+    turns[idx]["answer"] = answer
+    next_idx = idx + 1
+
+    if next_idx < len(turns):
+        doc = advance_explain_state(doc, EXPLAIN_ASKING, turns=turns, question_index=next_idx)
+        return doc, turns[next_idx]["question"]
+
+    doc = advance_explain_state(doc, EXPLAIN_READY_TO_SUMMARIZE, turns=turns, question_index=next_idx)
+    return doc, None
+
+
+def build_explain_summary_input(doc: dict) -> str:
+    """Assemble the summary prompt input straight from the stored explanation and turns"""
+    combined_history = f"Teacher explained:\n{doc['explanation']}\n\n"
+    for idx, turn in enumerate(doc.get("turns", []), 1):
+        combined_history += f"Question {idx}: {turn['question']}\nAnswer: {turn['answer']}\n\n"
+    return combined_history
+
+
+# ---- Pooled OpenAI client ----
+_openai_client = None
+_openai_client_lock = threading.Lock()
+
+def get_openai_client() -> AzureOpenAI:
+    """One AzureOpenAI client per worker so its HTTP connection pool is reused across requests"""
+    global _openai_client
+    with _openai_client_lock:
+        if _openai_client is None:
+            _openai_client = AzureOpenAI(
+                api_key=openai.api_key,
+                api_version=openai.api_version,
+                azure_endpoint=openai.api_base,
+            )
+        return _openai_client
+
+
+# ---- Explain summary generation ----
+def explain_summary_prompt(audience_level: str) -> str:
+    return f"""
+                You are a {audience_level.lower()} level student summarizing the teacher's explanation.
+                You must base your final summary on BOTH the teacher's main explanation and your answers to the three questions.
+                Focus on connecting ideas, giving examples, and explaining clearly to a {audience_level.lower()} audience.
+
+                Return ONLY JSON: {{"summary": "...", "keyPoints": ["...", "...", "..."]}}.
+
+                ⚠️ Important: Absolutely no extra commentary, no markdown formatting, no code block fences (no ```), and no explanations.
+                Return ONLY the raw JSON object, starting with {{ and ending with }}.
+                If you are unsure, return:
+                {{
+                "summary": "I'm not sure how to summarize this.",
+                "keyPoints": ["No questions identified."]
+                }}
+                """
+
+
+def request_explain_summary(client, audience_level: str, combined_history: str) -> str:
+    """Run the summary completion and return the raw model output"""
+    resp = client.chat.completions.create(
+        model=GPT_DEPLOYMENT_NAME,
+        messages=[
+            {"role": "system", "content": explain_summary_prompt(audience_level)},
+            {"role": "user", "content": combined_history}
+        ],
+        temperature=0,
+        max_tokens=500
+    )
+    return resp.choices[0].message.content.strip()
+
+
+def parse_explain_summary(raw: str) -> dict:
+    """Clean up the model output and parse it; raises ValueError when it isn't a usable summary"""
+    # Remove markdown fences and "json" tags
+    if raw.startswith("```"):
+        raw = raw.strip("```").strip()
+        raw = "\n".join(line for line in raw.splitlines() if not line.strip().startswith("json")).strip()
+
+    # Clean extra trailing characters like a rogue ]
+    if raw.endswith("]"):
+        raw = raw[:-1].strip()
+
+    # Fallback: Extract the first valid JSON object using regex
+    match = re.search(r'\{[\s\S]+\}', raw)
+    if match:
+        raw = match.group(0)
+
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"{e}\nRaw returned content:\n{raw}") from e
+    if not isinstance(data, dict):
+        raise ValueError(f"Not a dict\nRaw returned content:\n{raw}")
+    if "summary" not in data:
+        raise ValueError(f"Missing summary\nRaw returned content:\n{raw}")
+    return data
+
+
+# ---- Speculative Explain work ----
+# While the student is reading/answering, we use the idle time to
+#   * warm the pooled OpenAI client (TLS + connection setup) once questions start, and
+#   * start the summary completion as soon as the last answer is recorded.
+# Results are keyed by (session id, state version, audience level). Any later
+# transition bumps the version, so a stale result is cancelled and dropped rather
+# than served. The cache is per worker process: a summarize that lands on another
+# worker simply misses and runs the completion inline, and so does one whose
+# prefetch is still queued. A prefetch that's already running is waited on for at
+# most SPECULATIVE_WAIT_SECS, since it's usually further along than a fresh call.
+SPECULATIVE_WORKERS     = int(os.getenv("SPECULATIVE_WORKERS", "2"))
+SPECULATIVE_WAIT_SECS   = float(os.getenv("SPECULATIVE_WAIT_SECS", "15"))
+SPECULATIVE_MAX_ENTRIES = int(os.getenv("SPECULATIVE_MAX_ENTRIES", "256"))
+
+_speculative_pool = ThreadPoolExecutor(max_workers=SPECULATIVE_WORKERS, thread_name_prefix="speculative")
+_speculative_lock = threading.Lock()
+_speculative_summaries: dict[str, tuple[tuple, Future]] = {}
+_client_warmed_at = 0.0
+CLIENT_WARM_INTERVAL_SECS = 240
+
+
+def _speculative_key(doc: dict, audience_level: str) -> tuple:
+    return (doc.get("version", 0), audience_level)
+
+
+def _warm_openai_client():
+    try:
+        # cheap metadata call — only here to get a live pooled connection
+        get_openai_client().models.list()
+    except Exception as e:
+        print("⚠️ OpenAI warm-up failed:", e)
+
+
+def warm_openai_client_soon():
+    """Open the pooled connection in the background unless it was warmed recently"""
+    global _client_warmed_at
+    now = time.monotonic()
+    with _speculative_lock:
+        if now - _client_warmed_at < CLIENT_WARM_INTERVAL_SECS:
+            return
+        _client_warmed_at = now
+    _speculative_pool.submit(_warm_openai_client)
+
+
+def _speculative_summary_task(audience_level: str, combined_history: str) -> dict:
+    raw = request_explain_summary(get_openai_client(), audience_level, combined_history)
+    return parse_explain_summary(raw)
+
+
+def discard_speculative_summary(session_id: str):
+    with _speculative_lock:
+        entry = _speculative_summaries.pop(session_id, None)
+    if entry:
+        entry[1].cancel()
+
+
+def prefetch_explain_summary(session_id: str, doc: dict, audience_level: str):
+    """Kick off the summary completion for a session that just became ready to summarize"""
+    if doc.get("state") != EXPLAIN_READY_TO_SUMMARIZE:
+        return
+    key = _speculative_key(doc, audience_level)
+    with _speculative_lock:
+        entry = _speculative_summaries.get(session_id)
+        if entry and entry[0] == key:
+            return
+        if entry:
+            entry[1].cancel()
+        if len(_speculative_summaries) >= SPECULATIVE_MAX_ENTRIES:
+            # drop the oldest speculation rather than grow without bound
+            oldest = next(iter(_speculative_summaries))
+            _speculative_summaries.pop(oldest)[1].cancel()
+        future = _speculative_pool.submit(
+            _speculative_summary_task, audience_level, build_explain_summary_input(doc)
+        )
+        _speculative_summaries[session_id] = (key, future)
+
+
+def take_speculative_summary(session_id: str, doc: dict, audience_level: str) -> dict | None:
+    """Return the prefetched summary if it matches the current state, else None (and discard it)"""
+    with _speculative_lock:
+        entry = _speculative_summaries.pop(session_id, None)
+    if not entry:
+        return None
+    key, future = entry
+    if key != _speculative_key(doc, audience_level):
+        future.cancel()
+        return None
+    if future.cancel():
+        # still queued behind other prefetches: running it inline now is faster than waiting
+        return None
+    try:
+        return future.result(timeout=SPECULATIVE_WAIT_SECS)
+    except Exception as e:
+        print("⚠️ Speculative summary unusable, running inline:", e)
+        return None
+
+
+# ---- Near-duplicate transcript cache ----
+# Reuses Explain questions / Presentation feedback for rehearsals of the same talk.
+# Namespaced by mode + audience level so a Beginner never gets Expert feedback.
+TRANSCRIPT_CACHE_ENABLED = os.getenv("TRANSCRIPT_CACHE_ENABLED", "true").lower() == "true"
+transcript_cache = SimilarityCache(
+    threshold=float(os.getenv("TRANSCRIPT_CACHE_THRESHOLD", "0.8")),
+    max_entries=int(os.getenv("TRANSCRIPT_CACHE_MAX_ENTRIES", "2000")),
+    ttl_secs=float(os.getenv("TRANSCRIPT_CACHE_TTL_SECS")) if os.getenv("TRANSCRIPT_CACHE_TTL_SECS") else None,
+    persist_path=os.getenv("TRANSCRIPT_CACHE_PATH") or None,
+    silence_sensitive=("Presentation:",),  # pacing feedback depends on the [silence] markers
+)
+
+
+def cached_gpt_result(namespace: str, transcript: str):
+    """Cached value for a near-duplicate transcript, or None"""
+    if not TRANSCRIPT_CACHE_ENABLED:
+        return None
+    hit = transcript_cache.lookup(namespace, transcript)
+    if hit is None:
+        return None
+    value, similarity = hit
+    print(f"♻️ Transcript cache hit ({namespace}, similarity {similarity:.2f})")
+    return value
+
+
+def remember_gpt_result(namespace: str, transcript: str, value):
+    if TRANSCRIPT_CACHE_ENABLED:
+        transcript_cache.store(namespace, transcript, value)
+
+
+# ---- Presentation analysis ----
+def presentation_system_prompt(audience_level: str, mode: str = "Presentation") -> str:
+    return f"""You are an AI presentation coach analyzing a student's transcript.
+
+Context:
+- Audience Level: {audience_level}
+  Audience Level refers to the expertise level of the listeners and influences how the content should be delivered and reviewed:
+
+  • Beginner:
+    - Has little to no prior exposure to the topic.
+    - Needs clear definitions, simple explanations, and analogies.
+    - Avoids technical jargon unless clearly explained.
+    - Example: A high school student learning about AI for the first time.
+
+  • Intermediate:
+    - Has some background knowledge or education on the topic.
+    - Expects a structured explanation with relevant examples, context, and logical flow.
+    - Some technical terms are okay if integrated smoothly.
+    - Example: A college undergraduate with introductory coursework in the field.
+
+  • Expert:
+    - Highly knowledgeable; often has formal education or professional experience.
+    - Expects advanced depth, critical analysis, theoretical insights, and domain-specific vocabulary.
+    - Prefers concise yet rich content with minimal simplification.
+    - Example: A PhD holder or a subject matter expert attending a technical talk.
+
+- Mode: {mode}
+
+Tasks:
+1. Detect filler words (um, uh, like, you know, etc.) and quantify frequency.
+2. Identify [silence] markers as hesitations/pauses.
+3. Analyze the overall structure: note strengths/weaknesses and propose a clearer outline.
+4. Give specific tips to reduce fillers and improve pacing.
+5. Generate three tailored comprehension questions for a {audience_level} audience:
+   - Beginner: Focus on basic recall, definitions, or simple concepts of the presentation.
+   - Intermediate: Test applied understanding or explanation of key points.
+   - Expert: Include questions requiring synthesis, critique, or deeper analysis.
+
+6. Adjust the depth and tone of your critique to suit the audience level:
+   - Beginner:
+     • Provide feedback in a simple, positive, and supportive manner.
+     • Focus on building foundational speaking skills (clarity, confidence, pacing).
+     • Avoid technical or critical language that might overwhelm the student.
+   - Intermediate:
+     • Deliver clear and constructive critique that builds on presentation fundamentals.
+     • Introduce analytical language and point out logical or structural gaps.
+     • Offer practical improvement suggestions.
+   - Expert:
+     • Use precise, professional, and analytical feedback.
+     • Assume familiarity with presentation techniques and content delivery norms.
+     • Highlight subtle or high-level presentation weaknesses and refinements.
+
+7. Suggest 1–3 sentences from the student's transcript that could be rephrased, and provide clearer or more professional alternatives.
+Tone: Supportive, motivational, and professional. Focus on helping the student improve.
+
+RETURN **ONLY** the raw JSON, with absolutely no explanation, markdown, or extra text.
+{{
+  "summary": "...",                      // REQUIRED: Summary of the talk
+  "clarity": "...",                      // REQUIRED: Clarity feedback
+  "pacing": "...",                       // REQUIRED: Pacing feedback
+  "structureSuggestions": "...",         // REQUIRED: Suggestions to improve structure
+  "deliveryTips": "...",                 // REQUIRED: Tips for delivery
+  "questions": ["...", "...", "..."]     // REQUIRED: Comprehension questions
+  "rephrasingSuggestions": [
+    {{ "original": "...", "suggested": "..." }},
+    {{ "original": "...", "suggested": "..." }}
+  ]
+}}
+"""
+
+
+PRESENTATION_REQUIRED_KEYS = ("summary", "clarity", "pacing", "structureSuggestions", "deliveryTips", "questions")
+
+
+def _normalize_quote(text) -> str:
+    return " ".join(str(text).lower().split())
+
+
+def suggestions_quoting(transcript: str, suggestions) -> list:
+    """Rephrasing suggestions whose `original` sentence actually occurs in this transcript"""
+    spoken = _normalize_quote(transcript)
+    return [
+        s for s in suggestions or []
+        if isinstance(s, dict) and s.get("original") and _normalize_quote(s["original"]) in spoken
+    ]
+
+
+def analyze_presentation(client, transcript: str, audience_level: str) -> dict:
+    """Presentation feedback JSON for a transcript (near-duplicate cache first, then GPT)"""
+    cache_ns      = f"Presentation:{audience_level}"
+    feedback_json = cached_gpt_result(cache_ns, transcript)
+    if feedback_json is not None:
+        # the rest is reusable, but rephrasings quote the other student's sentences
+        return {
+            **feedback_json,
+            "rephrasingSuggestions": suggestions_quoting(transcript, feedback_json.get("rephrasingSuggestions")),
+        }
+
+    resp = client.chat.completions.create(
+        model=GPT_DEPLOYMENT_NAME,
+        messages=[
+            {"role": "system", "content": presentation_system_prompt(audience_level)},
+            {"role": "user", "content": f"Transcript:\n\n{transcript}"}
+        ],
+        temperature=0,
+        max_tokens=1000
+    )
+    raw = resp.choices[0].message.content.strip()
+    if raw.startswith("```"):
+        raw = "\n".join(raw.split("\n")[1:-1])
+
+    feedback_json = json.loads(raw)
+    # checked before caching, so one malformed reply isn't served to every near-duplicate
+    if not isinstance(feedback_json, dict):
+        raise ValueError("Presentation feedback from GPT is not a JSON object")
+    missing = [key for key in PRESENTATION_REQUIRED_KEYS if key not in feedback_json]
+    if missing:
+        raise ValueError(f"Presentation feedback from GPT is missing {', '.join(missing)}")
+    remember_gpt_result(cache_ns, transcript, feedback_json)
+    return feedback_json
+
+
+def presentation_feedback_record(feedback_json: dict) -> dict:
+    """Feedback as stored on the ChatsV2 session"""
+    return {
+        "clarity": feedback_json["clarity"],
+        "pacing": feedback_json["pacing"],
+        "structure": feedback_json["structureSuggestions"],
+        "deliveryTips": feedback_json["deliveryTips"],
+        "questions": feedback_json["questions"],
+        "rephrasing": feedback_json.get("rephrasingSuggestions", [])
+    }
+
+
+def presentation_feedback_response(feedback_json: dict) -> dict:
+    """Feedback as returned to the frontend"""
+    return {
+        "message": feedback_json.get("summary", ""),
+        "feedback": {
+            "clarity": feedback_json.get("clarity", ""),
+            "pacing": feedback_json.get("pacing", ""),
+            "structureSuggestions": [feedback_json.get("structureSuggestions", "")],
+            "deliveryTips": [feedback_json.get("deliveryTips", "")],
+            "questions": feedback_json.get("questions", []),
+            "rephrasingSuggestions": feedback_json.get("rephrasingSuggestions", [])
+        }
+    }
 
 
 # ----------------- TTS Endpoints -----------------
@@ -269,6 +1226,7 @@ def azure_transcribe(path: str) -> str:
     def on_done(evt):
         nonlocal done
         done = True
+    speechsdk = subsystem("speech")
     cfg = speechsdk.SpeechConfig(subscription=SPEECH_KEY, endpoint=SPEECH_ENDPOINT)
     aud = speechsdk.audio.AudioConfig(filename=path)
     rec = speechsdk.SpeechRecognizer(speech_config=cfg, audio_config=aud)
@@ -283,6 +1241,8 @@ def azure_transcribe(path: str) -> str:
 
 @app.route("/api/transcribe", methods=["POST"])
 def transcribe_audio_only():
+    audio = subsystem("audio")
+    subsystem("speech")  # fail fast with a 503 on workers without it
     try:
         if "audio" not in request.files:
             return jsonify({"error": "No audio file uploaded."}), 400
@@ -297,9 +1257,9 @@ def transcribe_audio_only():
         if not raw_bytes:
             return jsonify({"error": "Uploaded file is empty."}), 400
 
-        audio_seg = AudioSegment.from_file(BytesIO(raw_bytes))
+        audio_seg = audio.AudioSegment.from_file(BytesIO(raw_bytes))
 
-        chunks = split_on_silence(
+        chunks = audio.split_on_silence(
             audio_seg,
             min_silence_len=500,
             silence_thresh=audio_seg.dBFS - 16,
@@ -341,13 +1301,16 @@ def analyze_audio():
 
         # 🔥 Auto-create when missing
         session_chat = get_chat_history(session_id)
+        if session_chat and not session_visible_to(session_chat, request_user_id()):
+            return jsonify({"error": "Session not found"}), 404
 
         if not session_chat:
             _ = create_chat_session(
                 transcript=final_transcript,
                 mode=mode,
                 audience_level=audience_level,
-                session_id=session_id
+                session_id=session_id,
+                user_id=request_user_id()
             )
 
         
@@ -361,131 +1324,58 @@ def analyze_audio():
                 "timestamp": datetime.utcnow().isoformat() + "Z"
             }
         )
-        client = AzureOpenAI(
-            api_key=openai.api_key,
-            api_version=openai.api_version,
-            azure_endpoint=openai.api_base,
-        )
+        client = get_openai_client()
 
         if mode == "Explain":
             text = final_transcript.strip()
+            explain_state = load_explain_state(session_id)
+            state = explain_state["state"]
 
             # ⬅️ Only run this block if it's a summarize request
             if payload.get("summarize"):
-                session_chat = get_chat_history(session_id)
-                if session_chat is None:
-                    return jsonify({"error": "No chat session found for summary."}), 500
-
-                all_messages = session_chat.get("messages", [])
-                teacher_explanation = None
-                teacher_explanation = next(
-                    (
-                        msg["content"].strip()
-                        for msg in reversed(all_messages)
-                        if (
-                            msg["type"] == "user"
-                            and not msg["content"].lower().startswith("summarize")
-                            and len(msg["content"].strip().split()) > 10  # <- ignore short answers
-                        )
-                    ),
-                    None
-                )
-
-
-                if not teacher_explanation or teacher_explanation.strip().lower() in ["none", "null", ""]:
+                teacher_explanation = explain_state.get("explanation")
+                if state == EXPLAIN_AWAITING_EXPLANATION or not teacher_explanation or teacher_explanation.strip().lower() in ["none", "null", ""]:
                     print("⚠️ No valid teacher explanation found before 'summarize'")
                     return jsonify({
                         "error": "No explanation found before summarize command.",
                         "message": "Please provide an explanation before summarizing."
                     }), 200
 
+                if state == EXPLAIN_ASKING:
+                    remaining = len(explain_state["turns"]) - explain_state.get("question_index", 0)
+                    return jsonify({
+                        "error": "Questions still pending before summarize command.",
+                        "message": f"Please answer the remaining {remaining} question(s) before summarizing.",
+                        "sessionId": session_id
+                    }), 200
 
-
-
-
-                qa_pairs = []
-                current_q_idx = 0
-                for msg in all_messages:
-                    if msg["type"] == "assistant" and msg["content"].strip().endswith("?"):
-                        question = msg["content"].strip()
-                        for next_msg in all_messages:
-                            if next_msg["timestamp"] > msg["timestamp"] and next_msg["type"] == "user":
-                                answer = next_msg["content"].strip()
-                                qa_pairs.append((question, answer))
-                                break
-                        current_q_idx += 1
-                        if current_q_idx >= 3:
-                            break
-
-                combined_history = f"Teacher explained:\n{teacher_explanation}\n\n"
-                for idx, (q, a) in enumerate(qa_pairs, 1):
-                    combined_history += f"Question {idx}: {q}\nAnswer: {a}\n\n"
-
-                summary_prompt = f"""
-                You are a {audience_level.lower()} level student summarizing the teacher's explanation.
-                You must base your final summary on BOTH the teacher's main explanation and your answers to the three questions.
-                Focus on connecting ideas, giving examples, and explaining clearly to a {audience_level.lower()} audience.
-
-                Return ONLY JSON: {{"summary": "...", "keyPoints": ["...", "...", "..."]}}.
-
-                ⚠️ Important: Absolutely no extra commentary, no markdown formatting, no code block fences (no ```), and no explanations.
-                Return ONLY the raw JSON object, starting with {{ and ending with }}.
-                If you are unsure, return:
-                {{
-                "summary": "I'm not sure how to summarize this.",
-                "keyPoints": ["No questions identified."]
-                }}
-                """
-
+                combined_history = build_explain_summary_input(explain_state)
 
                 print("🧪 DEBUG — Starting summarize block")
                 print("🧪 Session ID:", session_id)
-                print("🧪 teacher_explanation:", repr(teacher_explanation))
-                print("🧪 All messages count:", len(all_messages))
-
-                print("🧪 Combined history being sent to GPT:")
-                print(combined_history)
-                try:
-                    resp = client.chat.completions.create(
-                        model=GPT_DEPLOYMENT_NAME,
-                        messages=[
-                            {"role": "system", "content": summary_prompt},
-                            {"role": "user", "content": combined_history}
-                        ],
-                        temperature=0,
-                        max_tokens=500
-                    )
-                except Exception as e:
-                    print("🔴 GPT call failed!")
-                    traceback.print_exc(file=sys.stdout)  # ← this shows the error clearly
-                    return jsonify({"error": "OpenAI request failed", "details": str(e)}), 500
-
-
-                raw = resp.choices[0].message.content.strip()
-                # Remove markdown fences and "json" tags
-                if raw.startswith("```"):
-                    raw = raw.strip("```").strip()
-                    raw = "\n".join(line for line in raw.splitlines() if not line.strip().startswith("json")).strip()
-
-                # Clean extra trailing characters like a rogue ]
-                if raw.endswith("]"):
-                    raw = raw[:-1].strip()
-
-                # Fallback: Extract the first valid JSON object using regex
-                match = re.search(r'\{[\s\S]+\}', raw)
-                if match:
-                    raw = match.group(0)
-
-                # Try parsing
-                try:
-                    data = json.loads(raw)
-                    assert isinstance(data, dict), "Not a dict"
-                    assert "summary" in data, "Missing summary"
-                except Exception as e:
-                    print("⚠️ JSON parsing error:", e)
-                    print("🔴 Raw returned content:\n", raw)
-                    return jsonify({"error": "Model returned invalid or incomplete JSON."}), 500
-
+                print("🧪 Explain state:", state, "turns:", len(explain_state["turns"]))
+
+                data = take_speculative_summary(session_id, explain_state, audience_level)
+                if data is not None:
+                    print("⚡ Using speculative summary")
+                else:
+                    print("🧪 Combined history being sent to GPT:")
+                    print(combined_history)
+                    try:
+                        raw = request_explain_summary(client, audience_level, combined_history)
+                    except Exception as e:
+                        print("🔴 GPT call failed!")
+                        traceback.print_exc(file=sys.stdout)  # ← this shows the error clearly
+                        return jsonify({"error": "OpenAI request failed", "details": str(e)}), 500
+
+                    try:
+                        data = parse_explain_summary(raw)
+                    except ValueError as e:
+                        print("⚠️ JSON parsing error:", e)
+                        return jsonify({"error": "Model returned invalid or incomplete JSON."}), 500
+
+
+                advance_explain_state(explain_state, EXPLAIN_SUMMARIZED, summary=data)
 
                 update_chat_session(
                     session_id,
@@ -499,21 +1389,13 @@ def analyze_audio():
                     "sessionId": session_id
                 })
 
-            # ⬇️ Continue with normal question flow (Q1–Q3)
-            explain_session = get_explain_session(session_id)
-            if not explain_session:
-                create_explain_session(session_id)
-                explain_session = get_explain_session(session_id)
-
-            explain_session = explain_session or {}
-
-            pending = explain_session.get("pending_questions", [])
-            current_q = explain_session.get("question_index", 0)
-            teacher_responses = explain_session.get("teacher_responses", [])
-
-            if not pending:
-                update_explain_session(session_id, {"original_text": text})
+            thank_you_message = (
+                "Thank you for answering all three questions! 🎉\n"
+                "When you're ready for the final summary, please type **summarize**."
+            )
 
+            # ⬇️ Continue with normal question flow (Q1–Q3)
+            if state in (EXPLAIN_AWAITING_EXPLANATION, EXPLAIN_SUMMARIZED):
                 prompt = f"""
                 You are a curious student with {audience_level.lower()} level knowledge.
                 After hearing the teacher's explanation, ask exactly 3 relevant follow-up questions.
@@ -521,25 +1403,28 @@ def analyze_audio():
                 Return ONLY JSON: {{"questions": ["q1", "q2", "q3"]}}.
                 """
 
-                resp = client.chat.completions.create(
-                    model=GPT_DEPLOYMENT_NAME,
-                    messages=[
-                        {"role": "system", "content": prompt},
-                        {"role": "user", "content": f"Teacher says:\n\n{text}"}
-                    ],
-                    temperature=0,
-                    max_tokens=300
-                )
-                raw = resp.choices[0].message.content.strip()
-                if raw.startswith("```"):
-                    raw = "\n".join(raw.split("\n")[1:-1]).strip()
-                questions = (json.loads(raw).get("questions") or [])[:3]
-
-                update_explain_session(session_id, {
-                    "pending_questions": questions,
-                    "teacher_responses": [],
-                    "question_index": 0
-                })
+                cache_ns  = f"Explain:questions:{audience_level}"
+                questions = cached_gpt_result(cache_ns, text)
+                if not questions:
+                    resp = client.chat.completions.create(
+                        model=GPT_DEPLOYMENT_NAME,
+                        messages=[
+                            {"role": "system", "content": prompt},
+                            {"role": "user", "content": f"Teacher says:\n\n{text}"}
+                        ],
+                        temperature=0,
+                        max_tokens=300
+                    )
+                    raw = resp.choices[0].message.content.strip()
+                    if raw.startswith("```"):
+                        raw = "\n".join(raw.split("\n")[1:-1]).strip()
+                    questions = (json.loads(raw).get("questions") or [])[:EXPLAIN_QUESTION_COUNT]
+                    if questions:
+                        remember_gpt_result(cache_ns, text, questions)
+
+                discard_speculative_summary(session_id)
+                explain_state = start_explain_turns(explain_state, text, questions)
+                warm_openai_client_soon()
 
                 first_question = questions[0]
                 update_chat_session(
@@ -552,14 +1437,23 @@ def analyze_audio():
                     "sessionId": session_id
                 })
 
-            # Answering Q2 and Q3
-            teacher_responses = teacher_responses + [text]
-            update_explain_session(session_id, {"teacher_responses": teacher_responses})
+            if state == EXPLAIN_READY_TO_SUMMARIZE:
+                # all questions answered already — keep nudging towards summarize
+                prefetch_explain_summary(session_id, explain_state, audience_level)
+                update_chat_session(
+                    session_id,
+                    {"type": "assistant", "content": thank_you_message, "timestamp": datetime.utcnow().isoformat() + "Z"}
+                )
+                return jsonify({
+                    "message": thank_you_message,
+                    "sessionId": session_id
+                })
 
-            if current_q + 1 < len(pending):
-                next_q = pending[current_q + 1]
-                update_explain_session(session_id, {"question_index": current_q + 1})
+            # Answering Q1–Q3
+            explain_state, next_q = record_explain_answer(explain_state, text)
 
+            if next_q is not None:
+                warm_openai_client_soon()
                 update_chat_session(
                     session_id,
                     {"type": "assistant", "content": next_q, "timestamp": datetime.utcnow().isoformat() + "Z"}
@@ -570,12 +1464,8 @@ def analyze_audio():
                     "sessionId": session_id
                 })
 
-            # After Q3
-            thank_you_message = (
-                "Thank you for answering all three questions! 🎉\n"
-                "When you're ready for the final summary, please type **summarize**."
-            )
-            update_explain_session(session_id, {"question_index": current_q + 1})
+            # After Q3 — start the summary while the student reads the thank-you
+            prefetch_explain_summary(session_id, explain_state, audience_level)
             update_chat_session(
                 session_id,
                 {"type": "assistant", "content": thank_you_message, "timestamp": datetime.utcnow().isoformat() + "Z"}
@@ -588,89 +1478,8 @@ def analyze_audio():
 
 
         elif mode == "Presentation":
-            system_prompt = f"""You are an AI presentation coach analyzing a student's transcript.
-
-Context:
-- Audience Level: {audience_level}
-  Audience Level refers to the expertise level of the listeners and influences how the content should be delivered and reviewed:
-
-  • Beginner:
-    - Has little to no prior exposure to the topic.
-    - Needs clear definitions, simple explanations, and analogies.
-    - Avoids technical jargon unless clearly explained.
-    - Example: A high school student learning about AI for the first time.
-
-  • Intermediate:
-    - Has some background knowledge or education on the topic.
-    - Expects a structured explanation with relevant examples, context, and logical flow.
-    - Some technical terms are okay if integrated smoothly.
-    - Example: A college undergraduate with introductory coursework in the field.
-
-  • Expert:
-    - Highly knowledgeable; often has formal education or professional experience.
-    - Expects advanced depth, critical analysis, theoretical insights, and domain-specific vocabulary.
-    - Prefers concise yet rich content with minimal simplification.
-    - Example: A PhD holder or a subject matter expert attending a technical talk.
-
-- Mode: {mode}
-
-Tasks:
-1. Detect filler words (um, uh, like, you know, etc.) and quantify frequency.
-2. Identify [silence] markers as hesitations/pauses.
-3. Analyze the overall structure: note strengths/weaknesses and propose a clearer outline.
-4. Give specific tips to reduce fillers and improve pacing.
-5. Generate three tailored comprehension questions for a {audience_level} audience:
-   - Beginner: Focus on basic recall, definitions, or simple concepts of the presentation.
-   - Intermediate: Test applied understanding or explanation of key points.
-   - Expert: Include questions requiring synthesis, critique, or deeper analysis.
-
-6. Adjust the depth and tone of your critique to suit the audience level:
-   - Beginner:
-     • Provide feedback in a simple, positive, and supportive manner.
-     • Focus on building foundational speaking skills (clarity, confidence, pacing).
-     • Avoid technical or critical language that might overwhelm the student.
-   - Intermediate:
-     • Deliver clear and constructive critique that builds on presentation fundamentals.
-     • Introduce analytical language and point out logical or structural gaps.
-     • Offer practical improvement suggestions.
-   - Expert:
-     • Use precise, professional, and analytical feedback.
-     • Assume familiarity with presentation techniques and content delivery norms.
-     • Highlight subtle or high-level presentation weaknesses and refinements.
-
-7. Suggest 1–3 sentences from the student's transcript that could be rephrased, and provide clearer or more professional alternatives.
-Tone: Supportive, motivational, and professional. Focus on helping the student improve.
-
-RETURN **ONLY** the raw JSON, with absolutely no explanation, markdown, or extra text.
-{{
-  "summary": "...",                      // REQUIRED: Summary of the talk
-  "clarity": "...",                      // REQUIRED: Clarity feedback
-  "pacing": "...",                       // REQUIRED: Pacing feedback
-  "structureSuggestions": "...",         // REQUIRED: Suggestions to improve structure
-  "deliveryTips": "...",                 // REQUIRED: Tips for delivery
-  "questions": ["...", "...", "..."]     // REQUIRED: Comprehension questions
-  "rephrasingSuggestions": [
-    {{ "original": "...", "suggested": "..." }},
-    {{ "original": "...", "suggested": "..." }}
-  ]
-}}
-"""
-
-            resp = client.chat.completions.create(
-                model=GPT_DEPLOYMENT_NAME,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Transcript:\n\n{final_transcript}"}
-                ],
-                temperature=0,
-                max_tokens=1000
-            )
-            raw = resp.choices[0].message.content.strip()
-            if raw.startswith("```"):
-                raw = "\n".join(raw.split("\n")[1:-1])
+            feedback_json = analyze_presentation(client, final_transcript, audience_level)
 
-            feedback_json = json.loads(raw)
-        
             update_chat_session(
                 session_id=session_id,
                 message={
@@ -678,32 +1487,19 @@ RETURN **ONLY** the raw JSON, with absolutely no explanation, markdown, or extra
                     "content": feedback_json["summary"],
                     "timestamp": datetime.utcnow().isoformat() + "Z"
                 },
-                feedback={
-                    "clarity": feedback_json["clarity"],
-                    "pacing": feedback_json["pacing"],
-                    "structure": feedback_json["structureSuggestions"],
-                    "deliveryTips": feedback_json["deliveryTips"],
-                    "questions": feedback_json["questions"],
-                    "rephrasing": feedback_json.get("rephrasingSuggestions", [])
-                }
+                feedback=presentation_feedback_record(feedback_json)
             )
-            return jsonify({
-                "message": feedback_json.get("summary", ""),
-                "feedback": {
-                    "clarity": feedback_json.get("clarity", ""),
-                    "pacing": feedback_json.get("pacing", ""),
-                   "structureSuggestions": [feedback_json.get("structureSuggestions", "")],
-                    "deliveryTips": [feedback_json.get("deliveryTips", "")],
-                    "questions": feedback_json.get("questions", []),
-                    "rephrasingSuggestions": feedback_json.get("rephrasingSuggestions", [])
-                }
-            })
+            return jsonify(presentation_feedback_response(feedback_json))
 
             
 
         else:
             return jsonify({ "error": f"Unknown mode {mode}" }), 400
 
+    except ExplainStateError as e:
+        print("⚠️ Rejected Explain turn:", e)
+        return jsonify({ "error": str(e), "sessionId": session_id }), 409
+
     except Exception as e:
         print("="*30)
         print("🔥 Caught final exception in analyze_audio")
@@ -717,10 +1513,137 @@ RETURN **ONLY** the raw JSON, with absolutely no explanation, markdown, or extra
 
 
 
+@app.route("/api/cache/stats", methods=["GET"])
+def transcript_cache_stats():
+    """GPT calls avoided by the near-duplicate cache and the similarity of its hits"""
+    return jsonify({"enabled": TRANSCRIPT_CACHE_ENABLED, **transcript_cache.stats()})
+
+
+# ----------------- Bulk Analysis -----------------
+# Instructors upload a whole class at once. Each transcript is analysed in
+# Presentation mode on a pool shared by all batches; a request keeps at most
+# BATCH_CONCURRENCY items queued there, so concurrent batches interleave and a
+# client that disconnects only has its in-flight items cancelled. Each session is
+# written to ChatsV2 as one finished document (user message + feedback) — a single
+# create instead of the create/read/upsert round trips the interactive path makes.
+# Batch items always start new sessions; a sessionId that already exists is reported
+# as an item error. Results are streamed back as NDJSON in completion order; one bad
+# item never aborts the batch.
+BATCH_MAX_ITEMS   = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+_batch_pool = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix="batch")
+
+
+def build_presentation_session(session_id: str, transcript: str, audience_level: str, feedback_json: dict, user_id: str | None = None) -> dict:
+    """A complete ChatsV2 document for one analysed transcript"""
+    now = datetime.utcnow().isoformat() + "Z"
+    return {
+        "id": session_id,
+        "sessionId": session_id,
+        "user_id": user_id,
+        "title": generate_chat_title(transcript),
+        "mode": "Presentation",
+        "audience_level": audience_level,
+        "messages": [
+            {"type": "user", "content": transcript, "timestamp": now},
+            {"type": "assistant", "content": feedback_json["summary"], "timestamp": now},
+        ],
+        "feedback": presentation_feedback_record(feedback_json),
+        "created_at": now,
+        "last_updated": now
+    }
+
+
+def _analyze_batch_item(client, item, user_id: str | None) -> dict:
+    if not isinstance(item, dict):
+        raise ValueError("Item must be an object")
+    transcript = (item.get("message") or "").strip()
+    if not transcript:
+        raise ValueError("Missing message")
+    audience_level = item.get("audienceLevel", "Beginner")
+    session_id     = item.get("sessionId") or str(uuid.uuid4())
+
+    if item.get("sessionId"):
+        # same rule as the other session routes: someone else's session doesn't exist for you
+        existing = get_chat_history(session_id)
+        if existing and not session_visible_to(existing, user_id):
+            raise ValueError("Session not found")
+        if existing:
+            raise ValueError(f"Session {session_id} already exists")
+
+    feedback_json = analyze_presentation(client, transcript, audience_level)
+    session = build_presentation_session(session_id, transcript, audience_level, feedback_json, user_id)
+    try:
+        # create, never upsert: an existing session (and its archive) must not be replaced
+        chat_sessions.create_item(body=session)
+    except CosmosResourceExistsError:
+        raise ValueError(f"Session {session_id} already exists")
+    if user_id:
+        record_presentation_progress(user_id, transcript, session["created_at"])
+    return {"sessionId": session_id, **presentation_feedback_response(feedback_json)}
+
+
+@app.route("/api/analyze/batch", methods=["POST"])
+def analyze_batch():
+    payload = request.get_json(silent=True) or {}
+    items = payload.get("items")
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Expected a non-empty 'items' list"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"Too many items (max {BATCH_MAX_ITEMS})"}), 400
+
+    client  = get_openai_client()
+    user_id = request_user_id()  # resolved here: the pool threads run outside the request context
+
+    def generate():
+        succeeded = failed = 0
+        pending   = iter(enumerate(items))
+        in_flight: dict[Future, int] = {}
+
+        def submit_next():
+            nxt = next(pending, None)
+            if nxt is not None:
+                index, item = nxt
+                in_flight[_batch_pool.submit(_analyze_batch_item, client, item, user_id)] = index
+
+        try:
+            for _ in range(BATCH_CONCURRENCY):
+                submit_next()
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = in_flight.pop(future)
+                    submit_next()
+                    item  = items[index]
+                    line  = {"index": index}
+                    if isinstance(item, dict) and "id" in item:
+                        line["id"] = item["id"]
+                    try:
+                        line.update(status="ok", **future.result())
+                        succeeded += 1
+                    except Exception as e:
+                        logging.exception(f"Batch item {index} failed")
+                        line.update(status="error", error=str(e))
+                        failed += 1
+                    yield json.dumps(line) + "\n"
+        except GeneratorExit:
+            # client went away: don't spend GPT calls and writes on results nobody reads
+            for future in in_flight:
+                future.cancel()
+            print(f"⚠️ Batch abandoned by client after {succeeded + failed}/{len(items)} items")
+            raise
+        yield json.dumps({"done": True, "total": len(items), "succeeded": succeeded, "failed": failed}) + "\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+
 # ----------------- Body Language Endpoints -----------------
 # ✅ MJPEG live stream endpoint
 @app.route("/api/bodytrack")
 def bodytrack():
+    cv2 = subsystem("vision").cv2
+
     def gen_frames():
         global last_frame
         while True:
@@ -740,6 +1663,7 @@ def bodytrack():
 def bodymetrics():
     global frame_count, upright_count, nod_count, hand_gesture_ct
     with frame_lock:
+        frames_seen = frame_count
         fc = frame_count or 1
         up = upright_count
         nd = nod_count
@@ -753,6 +1677,11 @@ def bodymetrics():
     gestures_per_min = int((hg / fc) * 30 * 60)
     nods_per_min     = int((nd / fc) * 30 * 60)
 
+    # each poll closes a metrics window; only count windows where the camera saw frames
+    user_id = request_user_id()
+    if user_id and frames_seen:
+        record_body_window(user_id, posture_score, gestures_per_min, nods_per_min)
+
     return jsonify({
         "postureScore": posture_score,
         "handGestureRate": gestures_per_min,
@@ -764,15 +1693,31 @@ def bodymetrics():
         ]
     })
 
+@app.route("/api/progress", methods=["GET"])
+def get_progress():
+    """Weekly filler-rate / pacing / posture trends for the signed-in user (one point read)"""
+    user_id = request_user_id()
+    if not user_id:
+        return jsonify({"error": "Unauthorized"}), 401
+    rollup = get_user_progress(user_id)
+    return jsonify({
+        "userId": user_id,
+        "weeks": progress.trends(rollup) if rollup else [],
+        "last_updated": rollup.get("last_updated") if rollup else None,
+    })
+
 # ===== NEW CHAT PANEL ENDPOINTS =====
 from azure.cosmos.exceptions import CosmosResourceNotFoundError
 
 @app.route("/api/chats", methods=["GET"])
 def list_chat_sessions():
-    # pull the 20 most recently‐updated sessions
-    query = """
+    # pull the caller's 20 most recently‐updated sessions (unowned ones for anonymous calls)
+    user_id = request_user_id()
+    owner_filter = "c.user_id = @uid" if user_id else "NOT IS_STRING(c.user_id)"
+    query = f"""
     SELECT c.id, c.sessionId, c.title, c.mode, c.created_at, c.last_updated
     FROM c
+    WHERE {owner_filter}
     ORDER BY c.last_updated DESC
     OFFSET 0 LIMIT 20
     """
@@ -780,6 +1725,7 @@ def list_chat_sessions():
     items = list(
       chat_sessions.query_items(
         query=query,
+        parameters=[{"name": "@uid", "value": user_id}] if user_id else None,
         enable_cross_partition_query=True
       )
     )
@@ -797,97 +1743,263 @@ def list_chat_sessions():
 
 @app.route("/api/chats/<session_id>", methods=["GET"])
 def get_chat_session(session_id: str):
-    """Get full chat history for main panel"""
-    session = get_chat_history(session_id)
-    if not session:
+    """Get chat history for main panel (?full=true also returns archived messages)"""
+    full = request.args.get("full", "").lower() in ("1", "true")
+    session = get_chat_history(session_id, full=full)
+    if not session or not session_visible_to(session, request_user_id()):
         return jsonify({"error": "Session not found"}), 404
     
     return jsonify(session)
 
 @app.route("/api/chats/<session_id>", methods=["DELETE"])
 def delete_chat_session(session_id: str):
+    session = get_chat_history(session_id)
+    if not session or not session_visible_to(session, request_user_id()):
+        return jsonify({"error": "Session not found"}), 404
     try:
         # deletes the item whose /id == session_id
         chat_sessions.delete_item(
           item=session_id,
           partition_key=session_id
         )
+        delete_archived_messages(session_id)
         return jsonify({"success": True})
     except CosmosResourceNotFoundError:
         return jsonify({"error": "Session not found"}), 404
 
 
-# Temporary in-memory users (for demo purposes)
-users = {}
+# ===== AUTH STORE =====
+# Accounts live in UserEmails (UserAuthDB), one doc per normalized email with
+# id == email (partition /id), so login is a single point read and signup a single
+# create. Accounts created before this only exist in Users: run
+#   flask --app app migrate-legacy-users
+# once to copy them over, then set LEGACY_USER_LOOKUP=false. Until then a point-read
+# miss falls back to an indexed case-insensitive STRINGEQUALS query on Users, with
+# misses remembered for LEGACY_MISS_TTL_SECS so unknown emails can't keep fanning out.
+# Password hashing/checking is deliberately slow, so it runs on a small bounded pool:
+# a burst of logins queues there (or gets a 503) instead of tying up every thread.
+AUTH_KDF_WORKERS   = int(os.getenv("AUTH_KDF_WORKERS", "2"))
+AUTH_KDF_QUEUE     = int(os.getenv("AUTH_KDF_QUEUE", "32"))
+AUTH_KDF_WAIT_SECS = float(os.getenv("AUTH_KDF_WAIT_SECS", "5"))
+LEGACY_USER_LOOKUP   = os.getenv("LEGACY_USER_LOOKUP", "true").lower() == "true"
+LEGACY_MISS_TTL_SECS = float(os.getenv("LEGACY_MISS_TTL_SECS", "600"))
+LEGACY_MISS_MAX      = 10000
 
-@app.route("/api/signup", methods=["POST"])
-def signup():
-    data     = request.get_json()
-    email    = data["email"]
-    password = data["password"]
+_legacy_misses_lock = threading.Lock()
+_legacy_misses: OrderedDict[str, float] = OrderedDict()
 
-    # 1) create user document
-    user_id = str(uuid.uuid4())
-    user_doc = {
-      "id":       user_id,
-      "email":    email,
-      "password": generate_password_hash(password),
-      # we'll fill in token next…
+_kdf_pool  = ThreadPoolExecutor(max_workers=AUTH_KDF_WORKERS, thread_name_prefix="kdf")
+_kdf_slots = threading.BoundedSemaphore(AUTH_KDF_WORKERS + AUTH_KDF_QUEUE)
+
+
+class AuthBusyError(Exception):
+    """Raised when the password-hashing pool is saturated"""
+
+
+def _run_kdf(fn, *args):
+    if not _kdf_slots.acquire(timeout=AUTH_KDF_WAIT_SECS):
+        raise AuthBusyError("Too many concurrent sign-ins, please retry shortly")
+    try:
+        return _kdf_pool.submit(fn, *args).result()
+    finally:
+        _kdf_slots.release()
+
+
+def hash_password(password: str) -> str:
+    return _run_kdf(generate_password_hash, password)
+
+
+def verify_password(password_hash: str, password: str) -> bool:
+    return _run_kdf(check_password_hash, password_hash, password)
+
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+
+def issue_token(user_id: str, email: str) -> str:
+    return jwt.encode({"sub": user_id, "email": email}, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+
+def _legacy_miss_cached(email: str) -> bool:
+    now = time.monotonic()
+    with _legacy_misses_lock:
+        expires = _legacy_misses.get(email)
+        if expires is None:
+            return False
+        if expires <= now:
+            del _legacy_misses[email]
+            return False
+        return True
+
+
+def _remember_legacy_miss(email: str):
+    with _legacy_misses_lock:
+        _legacy_misses[email] = time.monotonic() + LEGACY_MISS_TTL_SECS
+        _legacy_misses.move_to_end(email)
+        while len(_legacy_misses) > LEGACY_MISS_MAX:
+            _legacy_misses.popitem(last=False)
+
+
+def _migrate_legacy_user(legacy: dict, email: str) -> dict:
+    """Copy a Users doc into UserEmails (keeping whatever is already there)"""
+    account = {
+        "id":       email,
+        "userId":   legacy["id"],
+        "email":    email,
+        "password": legacy["password"],
+        "token":    legacy.get("token") or issue_token(legacy["id"], email),
+        "created_at": datetime.utcnow().isoformat() + "Z"
     }
-    users_container.create_item(body=user_doc)
+    try:
+        user_emails.create_item(body=account)
+        return account
+    except CosmosResourceExistsError:
+        return user_emails.read_item(item=email, partition_key=email)
+
+
+def get_account(email: str) -> dict | None:
+    """Point-read the account for a normalized email, migrating a legacy Users doc on first sight"""
+    try:
+        return user_emails.read_item(item=email, partition_key=email)
+    except CosmosResourceNotFoundError:
+        pass
+
+    if not LEGACY_USER_LOOKUP or _legacy_miss_cached(email):
+        return None
+
+    # legacy docs kept the email as typed at signup, so match case-insensitively
+    # (STRINGEQUALS with ignoreCase still uses the email index, unlike LOWER())
+    legacy = next(iter(users_container.query_items(
+        query="SELECT * FROM c WHERE STRINGEQUALS(c.email, @email, true)",
+        parameters=[{"name": "@email", "value": email}],
+        enable_cross_partition_query=True
+    )), None)
+    if not legacy:
+        _remember_legacy_miss(email)
+        return None
+    return _migrate_legacy_user(legacy, email)
+
+
+@app.cli.command("migrate-legacy-users")
+def migrate_legacy_users_command():
+    """Copy every Users account into UserEmails: flask --app app migrate-legacy-users"""
+    migrated = skipped = 0
+    for legacy in users_container.query_items(
+        query="SELECT * FROM c WHERE IS_STRING(c.email) AND IS_STRING(c.password)",
+        enable_cross_partition_query=True
+    ):
+        email = normalize_email(legacy["email"])
+        account = _migrate_legacy_user(legacy, email)
+        if account["userId"] == legacy["id"]:
+            migrated += 1
+        else:
+            print(f"[⚠] {email} already belongs to user {account['userId']}, skipped {legacy['id']}")
+            skipped += 1
+    print(f"✅ Migrated {migrated} legacy users ({skipped} skipped); LEGACY_USER_LOOKUP can now be set to false")
 
-    # 2) build a JWT whose sub=that new user_id
-    payload = {"sub": user_id, "email": email}
-    token   = jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
-    # 3) persist it on the user record
-    user_doc["token"] = token
-    users_container.upsert_item(body=user_doc)
+@app.route("/api/signup", methods=["POST"])
+def signup():
+    data     = request.get_json(silent=True) or {}
+    email    = normalize_email(data.get("email") or "")
+    password = data.get("password")
+    if not email or not password:
+        return jsonify({"message": "Email and password are required"}), 400
+
+    # an account that only exists in the legacy Users container still owns this email
+    if get_account(email):
+        return jsonify({"message": "An account with this email already exists"}), 409
+
+    # token is built up front so the account is written exactly once
+    user_id = str(uuid.uuid4())
+    token   = issue_token(user_id, email)
+    try:
+        account = {
+          "id":       email,
+          "userId":   user_id,
+          "email":    email,
+          "password": hash_password(password),
+          "token":    token,
+          "created_at": datetime.utcnow().isoformat() + "Z"
+        }
+        user_emails.create_item(body=account)
+    except AuthBusyError as e:
+        return jsonify({"message": str(e)}), 503
+    except CosmosResourceExistsError:
+        return jsonify({"message": "An account with this email already exists"}), 409
 
-    # 4) return it
     return jsonify({"message": "Signup successful!", "token": token}), 200
 
 
 
 @app.route("/api/login", methods=["POST"])
 def login():
-    data     = request.get_json()
-    email    = data.get("email")
+    data     = request.get_json(silent=True) or {}
+    email    = normalize_email(data.get("email") or "")
     password = data.get("password")
-
-    # fetch user from Cosmos
-    query = f"SELECT * FROM c WHERE c.email = '{email}'"
-    users = list(
-      users_container.query_items(
-        query=query,
-        enable_cross_partition_query=True
-      )
-    )
-    if not users or not check_password_hash(users[0]["password"], password):
+    if not email or not password:
         return jsonify({"message": "Invalid email or password"}), 401
 
-    user = users[0]
-
-    # pull the token we generated at signup
-    token = user.get("token")
-    if not token:
-        # (in case you’re migrating old users who didn’t get one yet...)
-        payload = {"sub": user["id"], "email": user["email"]}
-        token   = jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
-        user["token"] = token
-        users_container.upsert_item(body=user)
+    account = get_account(email)
+    try:
+        if not account or not verify_password(account["password"], password):
+            return jsonify({"message": "Invalid email or password"}), 401
+    except AuthBusyError as e:
+        return jsonify({"message": str(e)}), 503
 
-    return jsonify({"message": "Login successful!", "token": token}), 200
+    return jsonify({"message": "Login successful!", "token": account["token"]}), 200
 
 
 
 # ------------- Serve Frontend -------------
+# dist/ is loaded into memory once per worker (see static_assets.py), on the first
+# frontend request or in warm_up(), so importing the app never reads or compresses
+# the bundle; ship build-time .gz/.br files to skip the compression entirely.
+# Rebuild the frontend and restart the workers to pick up a new bundle.
+STATIC_DIR     = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dist")
+_static_assets = None
+_static_lock   = threading.Lock()
+
+
+def get_static_assets() -> StaticAssetManifest:
+    global _static_assets
+    with _static_lock:
+        if _static_assets is None:
+            started = time.perf_counter()
+            _static_assets = StaticAssetManifest(
+                STATIC_DIR,
+                brotli_quality=int(os.getenv("STATIC_BROTLI_QUALITY", "9")),
+            )
+            print(f"📦 Static assets loaded in {time.perf_counter() - started:.2f}s: {_static_assets.stats()}")
+        return _static_assets
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve_frontend(path):
-    if path and os.path.exists(app.static_folder + '/' + path):
-        return send_from_directory(app.static_folder, path)
-    return send_from_directory(app.static_folder, 'index.html')
+    asset = get_static_assets().lookup(path)
+    if asset is None:
+        return jsonify({"error": "Frontend build not found"}), 404
+
+    encoding, body, etag = asset.select(request.headers.get("Accept-Encoding", ""))
+    headers = {
+        "ETag":          etag,
+        "Cache-Control": asset.cache_control,
+        "Vary":          "Accept-Encoding",
+    }
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+
+    if _etag_matches(request.headers.get("If-None-Match", ""), etag):
+        return Response(status=304, headers=headers)
+    return Response(body, status=200, headers=headers, content_type=asset.content_type)
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
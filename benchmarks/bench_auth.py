@@ -0,0 +1,67 @@
+# benchmarks/bench_auth.py
+"""Per-request cost of authenticating a bearer token: verify every call vs. the verified-claims cache.
+
+    python benchmarks/bench_auth.py [--iterations N] [--users N]
+
+Needs only PyJWT (no Flask/Cosmos), so it can run anywhere the requirements are installed.
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+import jwt
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from token_cache import VerifiedTokenCache  # noqa: E402
+
+SECRET    = "bench-secret-" + "x" * 32
+ALGORITHM = "HS256"
+
+
+def decode(token: str) -> dict:
+    return jwt.decode(token, SECRET, algorithms=[ALGORITHM])
+
+
+def per_call_us(fn, tokens: list[str], iterations: int) -> float:
+    n = len(tokens)
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(tokens[i % n])
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200_000)
+    parser.add_argument("--users", type=int, default=500, help="distinct tokens in rotation")
+    args = parser.parse_args()
+
+    tokens = [
+        jwt.encode({"sub": str(uuid.uuid4()), "email": f"user{i}@example.com"}, SECRET, algorithm=ALGORITHM)
+        for i in range(args.users)
+    ]
+
+    cache = VerifiedTokenCache(decode, max_entries=args.users * 2)
+    for token in tokens:  # warm: every token verified once, like the first poll after login
+        cache.verify(token)
+
+    # a cache too small for the rotation — every lookup misses and pays the full verify
+    thrashing = VerifiedTokenCache(decode, max_entries=1)
+
+    results = [
+        ("jwt.decode on every request",       per_call_us(decode, tokens, args.iterations)),
+        ("VerifiedTokenCache hit",            per_call_us(cache.verify, tokens, args.iterations)),
+        ("VerifiedTokenCache miss (evicting)", per_call_us(thrashing.verify, tokens, args.iterations)),
+    ]
+
+    print(f"{args.iterations} requests over {args.users} tokens (PyJWT {jwt.__version__})")
+    width = max(len(name) for name, _ in results)
+    for name, us in results:
+        print(f"  {name:<{width}}  {us:8.2f} µs/request")
+    print(f"  speed-up on hit: {results[0][1] / results[1][1]:.1f}x   cache: {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# benchmarks/bench_startup.py
+"""Cold-start cost of a worker per WORKER_PROFILE: import time and peak RSS, before and after warm_up().
+
+    python benchmarks/bench_startup.py [--profiles api media all] [--repeat 3]
+
+Each measurement runs in a fresh interpreter so nothing is shared between runs.
+Needs the app's requirements installed; Cosmos/OpenAI aren't contacted.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+PROBE = r"""
+import json, resource, sys, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+rss_import = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+app.warm_up()
+t2 = time.perf_counter()
+rss_warm = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({
+    "import_s": t1 - t0,
+    "warm_up_s": t2 - t1,
+    "rss_import_mb": rss_import / 1024,
+    "rss_warm_mb": rss_warm / 1024,
+    "loaded": sorted(app._subsystems) + (["frontend"] if app._static_assets is not None else []),
+}))
+"""
+
+
+def measure(profile: str) -> dict:
+    env = {**os.environ, "WORKER_PROFILE": profile, "WARM_UP": "false"}
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    # the app prints startup notes; the probe's JSON is the last line
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profiles", nargs="+", default=["api", "media", "all"])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'profile':<8} {'import s':>9} {'RSS MB':>8} {'warm-up s':>10} {'warm RSS MB':>12}  loaded")
+    for profile in args.profiles:
+        runs = [measure(profile) for _ in range(args.repeat)]
+        med = lambda k: statistics.median(r[k] for r in runs)  # noqa: E731
+        print(f"{profile:<8} {med('import_s'):>9.2f} {med('rss_import_mb'):>8.0f} "
+              f"{med('warm_up_s'):>10.2f} {med('rss_warm_mb'):>12.0f}  {', '.join(runs[-1]['loaded']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
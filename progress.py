@@ -0,0 +1,179 @@
+# progress.py
+"""Per-user progress rollups (filler rate, pacing, posture) kept as compact weekly buckets.
+
+A rollup is one small JSON document per user. Presentation transcripts and
+body-metrics windows are folded into it incrementally, so a dashboard trend is a
+single point read instead of a scan over every session.
+"""
+import re
+from datetime import datetime
+
+MAX_WEEKS = 104  # two years of weekly buckets keeps the doc small
+
+# multi-word fillers first so "you know" isn't counted as two plain words
+FILLER_RE  = re.compile(r"\b(you know|i mean|kind of|sort of|um+|uh+|erm|er|ah|like|basically|actually|literally)\b", re.IGNORECASE)
+SILENCE_RE = re.compile(r"\[silence\]", re.IGNORECASE)
+WORD_RE    = re.compile(r"[A-Za-z0-9']+")
+
+# histogram bin edges (upper bounds, exclusive); the last bin is open-ended
+FILLER_RATE_BINS = [1, 2, 5, 10]          # fillers per 100 words
+PAUSE_RATE_BINS  = [2, 5, 10, 20]         # [silence] markers per 100 words
+POSTURE_BINS     = [20, 40, 60, 80]       # posture score 0-100
+
+
+def _bin_label(value: float, edges: list[int]) -> str:
+    low = 0
+    for edge in edges:
+        if value < edge:
+            return f"{low}-{edge}"
+        low = edge
+    return f"{low}+"
+
+
+def week_key(when: datetime | str | None = None) -> str:
+    """ISO week bucket, e.g. '2026-W42'"""
+    if when is None:
+        when = datetime.utcnow()
+    elif isinstance(when, str):
+        when = datetime.fromisoformat(when.rstrip("Z"))
+    year, week, _ = when.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def transcript_metrics(transcript: str) -> dict:
+    """Word, filler and pause counts for one transcript"""
+    text = SILENCE_RE.sub(" ", transcript)
+    return {
+        "words":   len(WORD_RE.findall(text)),
+        "fillers": len(FILLER_RE.findall(text)),
+        "pauses":  len(SILENCE_RE.findall(transcript)),
+    }
+
+
+def empty_rollup(user_id: str) -> dict:
+    return {
+        "id":     user_id,
+        "userId": user_id,
+        "weeks":  {},
+    }
+
+
+def _week(rollup: dict, key: str) -> dict:
+    weeks = rollup.setdefault("weeks", {})
+    if key not in weeks:
+        weeks[key] = {
+            "presentations": 0,
+            "words":         0,
+            "fillers":       0,
+            "pauses":        0,
+            "fillerRateHist": {},
+            "pauseRateHist":  {},
+            "bodyWindows":    0,
+            "postureSum":     0,
+            "gestureRateSum": 0,
+            "nodRateSum":     0,
+            "postureHist":    {},
+        }
+    return weeks[key]
+
+
+def _trim(rollup: dict):
+    weeks = rollup["weeks"]
+    for stale in sorted(weeks)[:-MAX_WEEKS]:
+        del weeks[stale]
+
+
+def _bump(hist: dict, label: str, by: int = 1):
+    hist[label] = hist.get(label, 0) + by
+
+
+def apply_presentation(rollup: dict, metrics: dict, when: datetime | str | None = None) -> dict:
+    """Fold one Presentation transcript's metrics into the rollup (in place)"""
+    week = _week(rollup, week_key(when))
+    week["presentations"] += 1
+    week["words"]   += metrics["words"]
+    week["fillers"] += metrics["fillers"]
+    week["pauses"]  += metrics["pauses"]
+    if metrics["words"]:
+        per100 = 100 / metrics["words"]
+        _bump(week["fillerRateHist"], _bin_label(metrics["fillers"] * per100, FILLER_RATE_BINS))
+        _bump(week["pauseRateHist"], _bin_label(metrics["pauses"] * per100, PAUSE_RATE_BINS))
+    _trim(rollup)
+    return rollup
+
+
+def apply_body_windows(rollup: dict, window: dict, when: datetime | str | None = None) -> dict:
+    """Fold accumulated body-metrics windows into the rollup (in place).
+
+    `window` holds sums over one or more /api/bodymetrics windows:
+    {"windows", "postureSum", "gestureRateSum", "nodRateSum", "postureHist"}.
+    """
+    week = _week(rollup, week_key(when))
+    week["bodyWindows"]    += window["windows"]
+    week["postureSum"]     += window["postureSum"]
+    week["gestureRateSum"] += window["gestureRateSum"]
+    week["nodRateSum"]     += window["nodRateSum"]
+    for label, count in window["postureHist"].items():
+        _bump(week["postureHist"], label, count)
+    _trim(rollup)
+    return rollup
+
+
+PRESENTATION_FIELDS = ("presentations", "words", "fillers", "pauses")
+PRESENTATION_HISTS  = ("fillerRateHist", "pauseRateHist")
+
+
+def replace_presentation_buckets(rollup: dict, source: dict) -> dict:
+    """Overwrite the Presentation part of every week in `rollup` with `source`'s (in place).
+
+    Used by the backfill: transcripts are rebuilt from the sessions, while the body-metrics
+    part of each week is left as it is, since body windows aren't stored on sessions.
+    """
+    weeks  = rollup.setdefault("weeks", {})
+    fresh  = source.get("weeks", {})
+    for key in set(weeks) | set(fresh):
+        target = _week(rollup, key)
+        week   = fresh.get(key, {})
+        for field in PRESENTATION_FIELDS:
+            target[field] = week.get(field, 0)
+        for field in PRESENTATION_HISTS:
+            target[field] = dict(week.get(field, {}))
+        if not target["presentations"] and not target["bodyWindows"]:
+            del weeks[key]
+    _trim(rollup)
+    return rollup
+
+
+def empty_body_window() -> dict:
+    return {"windows": 0, "postureSum": 0, "gestureRateSum": 0, "nodRateSum": 0, "postureHist": {}}
+
+
+def add_body_sample(window: dict, posture: int, gesture_rate: int, nod_rate: int) -> dict:
+    """Add one /api/bodymetrics reading to an in-memory window accumulator"""
+    window["windows"]        += 1
+    window["postureSum"]     += posture
+    window["gestureRateSum"] += gesture_rate
+    window["nodRateSum"]     += nod_rate
+    _bump(window["postureHist"], _bin_label(posture, POSTURE_BINS))
+    return window
+
+
+def trends(rollup: dict) -> list[dict]:
+    """Week-by-week averages for dashboards, oldest first"""
+    out = []
+    for key in sorted(rollup.get("weeks", {})):
+        week = rollup["weeks"][key]
+        words, windows = week["words"], week["bodyWindows"]
+        out.append({
+            "week":               key,
+            "presentations":      week["presentations"],
+            "fillerRate":         round(100 * week["fillers"] / words, 2) if words else None,
+            "pausesPer100Words":  round(100 * week["pauses"] / words, 2) if words else None,
+            "postureScore":       round(week["postureSum"] / windows, 1) if windows else None,
+            "handGestureRate":    round(week["gestureRateSum"] / windows, 1) if windows else None,
+            "headNodRate":        round(week["nodRateSum"] / windows, 1) if windows else None,
+            "fillerRateHistogram": week["fillerRateHist"],
+            "pauseRateHistogram":  week["pauseRateHist"],
+            "postureHistogram":    week["postureHist"],
+        })
+    return out
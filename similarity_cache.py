@@ -0,0 +1,256 @@
+# similarity_cache.py
+"""Near-duplicate transcript cache (MinHash signatures + LSH banding over word shingles).
+
+Students rehearse the same talk with small wording changes, so an exact-match
+cache almost never hits. Each transcript is reduced to a MinHash signature; LSH
+bands narrow the candidates and the signature agreement estimates the Jaccard
+similarity of the two shingle sets. Entries are kept in memory in LRU order,
+optionally expire after a TTL and can be persisted to a JSON file.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH       = (1 << 32) - 1
+_WORD_RE        = re.compile(r"[a-z0-9']+")
+# [silence] markers come from /api/transcribe: noise for content-only results, but
+# the hesitation signal for pacing feedback, so they're kept as tokens when asked
+_TOKEN_RE       = re.compile(r"\[silence\]|[a-z0-9']+")
+
+
+def shingles(text: str, size: int = 3, keep_silence: bool = False) -> set[str]:
+    """Lower-cased word n-grams of the transcript (the whole text if it is shorter than one shingle)"""
+    words = (_TOKEN_RE if keep_silence else _WORD_RE).findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class SimilarityCache:
+    """Thread-safe MinHash/LSH cache of GPT results keyed by (namespace, transcript)"""
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        num_perm: int = 64,
+        bands: int = 16,
+        shingle_size: int = 3,
+        max_entries: int = 2000,
+        ttl_secs: float | None = None,
+        persist_path: str | None = None,
+        persist_every: int = 20,
+        silence_sensitive: tuple[str, ...] = (),
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold     = threshold
+        self.num_perm      = num_perm
+        self.bands         = bands
+        self.rows          = num_perm // bands
+        self.shingle_size  = shingle_size
+        self.max_entries   = max_entries
+        self.ttl_secs      = ttl_secs
+        self.persist_path  = persist_path
+        self.persist_every = persist_every
+        # namespaces (by prefix) whose results depend on pauses, e.g. ("Presentation:",)
+        self.silence_sensitive = silence_sensitive
+
+        rng = random.Random(1)  # fixed seed so signatures stay comparable across restarts
+        self._perms = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+        self._lock     = threading.Lock()
+        self._entries: OrderedDict[int, dict] = OrderedDict()
+        self._buckets: dict[tuple, set[int]] = {}
+        self._next_id  = 0
+        self._dirty    = 0
+
+        self.lookups   = 0
+        self.hits      = 0
+        self.evictions = 0
+        self._hit_histogram: dict[str, int] = {}
+
+        if persist_path and os.path.exists(persist_path):
+            self.load()
+
+    # ---- signatures ----
+    def signature(self, text: str, keep_silence: bool = False) -> list[int] | None:
+        grams = shingles(text, self.shingle_size, keep_silence)
+        if not grams:
+            return None
+        hashed = [
+            int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest(), "big")
+            for g in grams
+        ]
+        return [
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashed)
+            for a, b in self._perms
+        ]
+
+    def _signature_for(self, namespace: str, text: str) -> list[int] | None:
+        return self.signature(text, keep_silence=namespace.startswith(self.silence_sensitive))
+
+    def _band_keys(self, namespace: str, sig: list[int]) -> list[tuple]:
+        return [
+            (namespace, band, tuple(sig[band * self.rows:(band + 1) * self.rows]))
+            for band in range(self.bands)
+        ]
+
+    @staticmethod
+    def _similarity(a: list[int], b: list[int]) -> float:
+        return sum(x == y for x, y in zip(a, b)) / len(a)
+
+    # ---- bookkeeping (callers hold self._lock) ----
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id, None)
+        if not entry:
+            return
+        for key in self._band_keys(entry["namespace"], entry["signature"]):
+            bucket = self._buckets.get(key)
+            if bucket:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def _expired(self, entry: dict, now: float) -> bool:
+        return self.ttl_secs is not None and now - entry["stored_at"] > self.ttl_secs
+
+    def _insert(self, namespace: str, sig: list[int], value, stored_at: float):
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = {
+            "namespace": namespace,
+            "signature": sig,
+            "value":     value,
+            "stored_at": stored_at,
+        }
+        for key in self._band_keys(namespace, sig):
+            self._buckets.setdefault(key, set()).add(entry_id)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _record_hit(self, similarity: float):
+        # 0.05-wide buckets, e.g. "0.85-0.90"
+        low = min(int(similarity * 20), 19) / 20
+        label = f"{low:.2f}-{low + 0.05:.2f}"
+        self._hit_histogram[label] = self._hit_histogram.get(label, 0) + 1
+
+    # ---- public API ----
+    def lookup(self, namespace: str, text: str):
+        """Return (value, similarity) of the closest cached transcript above the threshold, else None"""
+        sig = self._signature_for(namespace, text)
+        now = time.time()
+        with self._lock:
+            self.lookups += 1
+            if sig is None:
+                return None
+
+            candidates: set[int] = set()
+            for key in self._band_keys(namespace, sig):
+                candidates |= self._buckets.get(key, set())
+
+            best_id, best_sim = None, 0.0
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                if self._expired(entry, now):
+                    self._remove(entry_id)
+                    self.evictions += 1
+                    continue
+                sim = self._similarity(sig, entry["signature"])
+                if sim > best_sim:
+                    best_id, best_sim = entry_id, sim
+
+            if best_id is None or best_sim < self.threshold:
+                return None
+
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            self._record_hit(best_sim)
+            return self._entries[best_id]["value"], best_sim
+
+    def store(self, namespace: str, text: str, value):
+        """Cache a JSON-serialisable GPT result for this transcript"""
+        sig = self._signature_for(namespace, text)
+        if sig is None:
+            return
+        with self._lock:
+            self._insert(namespace, sig, value, time.time())
+            self._dirty += 1
+            flush = self.persist_path and self._dirty >= self.persist_every
+        if flush:
+            self.save()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries":       len(self._entries),
+                "threshold":     self.threshold,
+                "lookups":       self.lookups,
+                "hits":          self.hits,
+                "misses":        self.lookups - self.hits,
+                "gptCallsAvoided": self.hits,
+                "hitRate":       round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+                "evictions":     self.evictions,
+                "hitSimilarity": dict(sorted(self._hit_histogram.items())),
+            }
+
+    # ---- persistence ----
+    def save(self):
+        """Write the entries to persist_path atomically; I/O errors are logged, never raised,
+        so a failed flush can't fail the request that triggered it"""
+        if not self.persist_path:
+            return
+        with self._lock:
+            snapshot = {
+                "num_perm":     self.num_perm,
+                "shingle_size": self.shingle_size,
+                "silence_sensitive": list(self.silence_sensitive),
+                "entries":      list(self._entries.values()),
+            }
+            self._dirty = 0
+        # per-process temp file: every worker may flush to the same persist_path
+        directory = os.path.dirname(os.path.abspath(self.persist_path))
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix=".similarity-cache-", suffix=".tmp", dir=directory)
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump(snapshot, fh)
+            os.replace(tmp_path, self.persist_path)
+        except OSError as e:
+            print(f"⚠️ Could not save similarity cache to {self.persist_path}: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    def load(self):
+        """Load entries written by save(); a file built with different parameters is ignored"""
+        try:
+            with open(self.persist_path, encoding="utf-8") as fh:
+                snapshot = json.load(fh)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not load similarity cache from {self.persist_path}: {e}")
+            return
+        if (snapshot.get("num_perm") != self.num_perm
+                or snapshot.get("shingle_size") != self.shingle_size
+                or snapshot.get("silence_sensitive", []) != list(self.silence_sensitive)):
+            print("⚠️ Similarity cache file was built with different parameters, ignoring it")
+            return
+        now = time.time()
+        with self._lock:
+            for entry in snapshot.get("entries", []):
+                if self._expired(entry, now):
+                    continue
+                self._insert(entry["namespace"], entry["signature"], entry["value"], entry["stored_at"])
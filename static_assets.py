@@ -0,0 +1,172 @@
+# static_assets.py
+"""In-memory manifest of the built frontend (dist/) with precompressed variants.
+
+dist/ is scanned once at startup. Every file is held in memory along with gzip and
+(if the Brotli package is installed) brotli variants, either picked up from
+build-time `.gz`/`.br` siblings or compressed here. Responses carry strong ETags,
+answer If-None-Match with 304, and Vite's content-hashed bundles (listed in the
+build's manifest.json, or recognised by their assets/[name]-[hash].[ext] name) get
+immutable cache headers. Unknown paths fall back to the cached index.html for the
+SPA router, so serving a request never touches the filesystem.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+try:
+    import brotli
+except ImportError:  # optional: gzip-only without it
+    brotli = None
+
+# Vite's default output name: assets/[name]-[hash].[ext], with an 8-char base64url
+# hash (so it may contain "-" or "_"), e.g. assets/index-B7c2-Q9d.js. Used only when
+# the build has no manifest.json listing the emitted files.
+HASHED_NAME_RE = re.compile(r"-[A-Za-z0-9_-]{8}\.[a-z0-9]+$")
+VITE_MANIFESTS = (".vite/manifest.json", "manifest.json")
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml",
+                      "application/xml", "application/wasm", "application/manifest+json")
+IMMUTABLE_CACHE    = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE   = "no-cache"
+MIN_COMPRESS_BYTES = 1024
+
+
+def _etag(data: bytes) -> str:
+    return '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+
+
+def _accepts(accept_encoding: str, coding: str) -> bool:
+    """True if the Accept-Encoding header allows `coding` (honours q=0).
+
+    An entry naming the coding wins over `*`, wherever either appears in the header.
+    """
+    wildcard = None
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if name not in (coding, "*"):
+            continue
+        q = 1.0
+        param = params.strip()
+        if param.startswith("q="):
+            try:
+                q = float(param[2:])
+            except ValueError:
+                q = 0.0
+        if name == coding:
+            return q > 0
+        wildcard = q > 0
+    return bool(wildcard)
+
+
+class StaticAsset:
+    __slots__ = ("path", "content_type", "cache_control", "variants")
+
+    def __init__(self, path: str, content_type: str, cache_control: str, variants: dict[str, tuple[bytes, str]]):
+        self.path          = path
+        self.content_type  = content_type
+        self.cache_control = cache_control
+        # encoding ("identity" / "gzip" / "br") -> (body, etag)
+        self.variants      = variants
+
+    def select(self, accept_encoding: str) -> tuple[str, bytes, str]:
+        """Best (encoding, body, etag) for the client's Accept-Encoding"""
+        for coding in ("br", "gzip"):
+            if coding in self.variants and _accepts(accept_encoding, coding):
+                return (coding, *self.variants[coding])
+        return ("identity", *self.variants["identity"])
+
+
+class StaticAssetManifest:
+    def __init__(self, root: str, index: str = "index.html", brotli_quality: int = 9, gzip_level: int = 9):
+        self.root           = root
+        self.index          = index
+        self.brotli_quality = brotli_quality
+        self.gzip_level     = gzip_level
+        self.assets: dict[str, StaticAsset] = {}
+        self.hashed_files: set[str] | None = None
+        self.scan()
+
+    def scan(self):
+        """(Re)build the manifest from disk"""
+        assets: dict[str, StaticAsset] = {}
+        self.hashed_files = self._read_vite_manifest()
+        if os.path.isdir(self.root):
+            for dirpath, _, filenames in os.walk(self.root):
+                for name in filenames:
+                    if name.endswith((".gz", ".br")):
+                        continue  # picked up as variants of the original file
+                    full = os.path.join(dirpath, name)
+                    rel  = os.path.relpath(full, self.root).replace(os.sep, "/")
+                    assets[rel] = self._load(rel, full)
+        self.assets = assets
+
+    def _load(self, rel: str, full: str) -> StaticAsset:
+        with open(full, "rb") as fh:
+            data = fh.read()
+
+        content_type = mimetypes.guess_type(rel)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type in ("application/javascript", "application/json"):
+            content_type += "; charset=utf-8"
+
+        variants = {"identity": (data, _etag(data))}
+        if content_type.startswith(COMPRESSIBLE_TYPES) and len(data) >= MIN_COMPRESS_BYTES:
+            gz = self._read_sibling(full + ".gz")
+            if gz is None:
+                gz = gzip.compress(data, compresslevel=self.gzip_level, mtime=0)
+            br = self._read_sibling(full + ".br")
+            if br is None and brotli is not None:
+                br = brotli.compress(data, quality=self.brotli_quality)
+            # only keep a variant that actually saves bytes
+            if len(gz) < len(data):
+                variants["gzip"] = (gz, _etag(gz))
+            if br is not None and len(br) < len(data):
+                variants["br"] = (br, _etag(br))
+
+        return StaticAsset(rel, content_type, IMMUTABLE_CACHE if self._is_hashed(rel) else REVALIDATE_CACHE, variants)
+
+    def _is_hashed(self, rel: str) -> bool:
+        if self.hashed_files is not None:
+            return rel in self.hashed_files
+        return rel.startswith("assets/") and HASHED_NAME_RE.search(rel) is not None
+
+    def _read_vite_manifest(self) -> set[str] | None:
+        """Files Vite emitted with a content hash, from build.manifest output (None if absent)"""
+        for name in VITE_MANIFESTS:
+            path = os.path.join(self.root, name)
+            if not os.path.exists(path):
+                continue
+            try:
+                with open(path, encoding="utf-8") as fh:
+                    manifest = json.load(fh)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Could not read {path}, falling back to file-name matching: {e}")
+                return None
+            hashed = set()
+            for chunk in manifest.values():
+                if chunk.get("file"):
+                    hashed.add(chunk["file"])
+                hashed.update(chunk.get("css", []))
+                hashed.update(chunk.get("assets", []))
+            return hashed
+        return None
+
+    @staticmethod
+    def _read_sibling(path: str) -> bytes | None:
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as fh:
+            return fh.read()
+
+    def lookup(self, path: str) -> StaticAsset | None:
+        """The asset for a request path, falling back to index.html (None if there is no build)"""
+        return self.assets.get(path.lstrip("/")) or self.assets.get(self.index)
+
+    def stats(self) -> dict:
+        return {
+            "files": len(self.assets),
+            "bytes": sum(len(a.variants["identity"][0]) for a in self.assets.values()),
+            "brotli": brotli is not None,
+        }
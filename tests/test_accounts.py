@@ -0,0 +1,89 @@
+# tests/test_accounts.py
+"""Signup/login against legacy Users accounts, with in-memory stand-ins for the Cosmos containers.
+
+    python tests/test_accounts.py
+"""
+import os
+import sys
+import unittest
+
+os.environ.setdefault("JWT_SECRET", "test-secret-" + "x" * 32)
+os.environ.setdefault("WORKER_PROFILE", "api")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from azure.cosmos.exceptions import CosmosResourceExistsError, CosmosResourceNotFoundError  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+import app as app_module  # noqa: E402
+
+
+class FakeUserEmails:
+    def __init__(self):
+        self.items = {}
+
+    def read_item(self, item, partition_key):
+        if item not in self.items:
+            raise CosmosResourceNotFoundError(message="not found")
+        return self.items[item]
+
+    def create_item(self, body):
+        if body["id"] in self.items:
+            raise CosmosResourceExistsError(message="exists")
+        self.items[body["id"]] = dict(body)
+        return body
+
+
+class FakeLegacyUsers:
+    """Answers get_account's STRINGEQUALS(c.email, @email, true) query"""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def query_items(self, query, parameters=None, enable_cross_partition_query=False):
+        assert "STRINGEQUALS(c.email, @email, true)" in query
+        email = parameters[0]["value"]
+        return [doc for doc in self.docs if doc["email"].lower() == email.lower()]
+
+
+class LegacySignupTest(unittest.TestCase):
+    def setUp(self):
+        self.legacy = {
+            "id":       "legacy-user-1",
+            "email":    "Legacy@X.com",
+            "password": generate_password_hash("old-password"),
+        }
+        self.user_emails = FakeUserEmails()
+        self.patch("user_emails", self.user_emails)
+        self.patch("users_container", FakeLegacyUsers([self.legacy]))
+        self.patch("LEGACY_USER_LOOKUP", True)
+        app_module._legacy_misses.clear()
+        self.client = app_module.app.test_client()
+
+    def patch(self, name, value):
+        original = getattr(app_module, name)
+        setattr(app_module, name, value)
+        self.addCleanup(setattr, app_module, name, original)
+
+    def test_signup_refuses_mixed_case_legacy_email(self):
+        resp = self.client.post("/api/signup", json={"email": "legacy@x.com", "password": "new-password"})
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(self.user_emails.items["legacy@x.com"]["userId"], "legacy-user-1")
+
+        resp = self.client.post("/api/login", json={"email": "legacy@x.com", "password": "old-password"})
+        self.assertEqual(resp.status_code, 200)
+
+    def test_login_ignores_stale_bearer_token(self):
+        headers = {"Authorization": "Bearer not-a-valid-token"}
+        resp = self.client.post("/api/login", headers=headers,
+                                json={"email": "legacy@x.com", "password": "old-password"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.client.get("/api/chats", headers=headers).status_code, 401)
+
+    def test_signup_for_unknown_email_succeeds(self):
+        resp = self.client.post("/api/signup", json={"email": "new@x.com", "password": "pw"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("new@x.com", self.user_emails.items)
+
+
+if __name__ == "__main__":
+    unittest.main()
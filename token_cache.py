@@ -0,0 +1,66 @@
+# token_cache.py
+"""Bounded LRU of verified JWT claims, keyed by a digest of the token.
+
+Every session-scoped route (including the 5-second /api/bodymetrics poll) needs the
+caller's claims. Verifying the signature once and then serving the decoded claims
+from memory makes repeat calls a hash + dict lookup. Entries are dropped when the
+token's own `exp` passes, or after `default_ttl` for tokens issued without one, so
+the cache never extends a token's lifetime.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class VerifiedTokenCache:
+    """Thread-safe cache in front of a `decode(token) -> claims` function that raises on bad tokens"""
+
+    def __init__(self, decode, max_entries: int = 4096, default_ttl: float = 300.0, clock=time.time):
+        self._decode      = decode
+        self.max_entries  = max_entries
+        self.default_ttl  = default_ttl
+        self._clock       = clock
+        self._lock        = threading.Lock()
+        self._entries: OrderedDict[bytes, tuple[float, dict]] = OrderedDict()
+        self.hits   = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        # never keep raw bearer tokens around in memory as dict keys
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def verify(self, token: str) -> dict:
+        """Claims for a token, verifying it on the first sight; re-raises the decoder's error on bad tokens"""
+        key = self._key(token)
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                del self._entries[key]
+            self.misses += 1
+
+        claims = self._decode(token)
+
+        expires_at = now + self.default_ttl
+        if isinstance(claims.get("exp"), (int, float)):
+            expires_at = min(expires_at, claims["exp"])
+        with self._lock:
+            self._entries[key] = (expires_at, claims)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return claims
+
+    def invalidate(self, token: str):
+        with self._lock:
+            self._entries.pop(self._key(token), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}